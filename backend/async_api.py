@@ -0,0 +1,113 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
+from .database import get_async_db
+from .schemas import ProcessoSchema, EvidenciaUnificada, ChatMessageSchema
+from . import evidencia_service, fast_json, http_cache, read_service
+from .page_cache import page_cache
+
+# Async versions of the hot read endpoints (DB_MODE=async, see database.py).
+# Same paths, parameters, responses and ETags as the sync handlers in main.py, which
+# install() replaces; the statements come from read_service so both modes run the same SQL.
+router = APIRouter()
+
+
+async def _rows(db, query):
+    return [dict(row) for row in (await db.execute(query)).mappings()]
+
+
+@router.get("/processos", response_model=List[ProcessoSchema])
+async def list_processos(request: Request, response: Response, skip: int = 0, limit: int = 100, db=Depends(get_async_db)):
+    versions = (await db.execute(read_service.processos_version_query())).one()
+    etag = read_service.processos_etag(skip, limit, versions)
+    if http_cache.is_fresh(request, etag):
+        return http_cache.not_modified(etag)
+
+    query = read_service.processos_query(skip, limit)
+    if fast_json.ENABLED:
+        return fast_json.FastJSONResponse(await _rows(db, query), headers=http_cache.validator_headers(etag))
+    response.headers.update(http_cache.validator_headers(etag))
+    return (await db.execute(query)).scalars().all()
+
+
+@router.get("/processos/{processo_id}/evidencias", response_model=List[EvidenciaUnificada])
+async def list_evidencias_processo(
+    processo_id: int,
+    request: Request,
+    response: Response,
+    tipo: Optional[str] = None,
+    pg_min: Optional[int] = None,
+    pg_max: Optional[int] = None,
+    q: Optional[str] = None,
+    order: str = "pagina",
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db=Depends(get_async_db)
+):
+    """Async version of main.list_evidencias_processo (same parameters and headers)."""
+    headers = {}
+    data_version = (await db.execute(read_service.data_version_query(processo_id))).scalar()
+    if data_version is not None:
+        etag = read_service.evidencias_etag(processo_id, data_version, tipo, pg_min, pg_max, q, order, limit, cursor, fields)
+        if http_cache.is_fresh(request, etag):
+            return http_cache.not_modified(etag)
+        headers.update(http_cache.validator_headers(etag))
+
+    fields = read_service.listing_fields(fields)
+    try:
+        evidencias, next_cursor = await evidencia_service.list_unificadas_async(
+            db, processo_id, tipo=tipo, pg_min=pg_min, pg_max=pg_max, q=q, cursor=cursor, limit=limit, order=order,
+            fields=fields
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    if fields:
+        return fast_json.FastJSONResponse(evidencias, headers=headers)
+    response.headers.update(headers)
+    return evidencias
+
+
+async def _text_processo(db, processo_id: int):
+    processo = (await db.execute(read_service.processo_query(processo_id))).scalar()
+    real_path = read_service.text_path(processo)
+    if not real_path:
+        raise HTTPException(status_code=404, detail="Arquivo de texto não encontrado para este processo.")
+    return processo, real_path
+
+
+@router.get("/processos/{processo_id}/pagina_texto")
+async def get_pagina_texto(processo_id: int, pagina: int, db=Depends(get_async_db)):
+    processo, real_path = await _text_processo(db, processo_id)
+    # page_cache may read the text file: kept off the event loop
+    content = await run_in_threadpool(page_cache.get_page, processo_id, real_path, processo.marcador_pagina, pagina)
+    return {"conteudo": content}
+
+
+@router.get("/processos/{processo_id}/paginas_texto")
+async def get_paginas_texto(processo_id: int, paginas: List[int] = Query(...), db=Depends(get_async_db)):
+    processo, real_path = await _text_processo(db, processo_id)
+    content = await run_in_threadpool(page_cache.get_pages, processo_id, real_path, processo.marcador_pagina, paginas)
+    return {"paginas": content}
+
+
+@router.get("/chat_sessions/{session_id}/messages", response_model=List[ChatMessageSchema])
+async def get_chat_messages(session_id: int, db=Depends(get_async_db)):
+    query = read_service.messages_query(session_id)
+    if fast_json.ENABLED:
+        return fast_json.FastJSONResponse(await _rows(db, query))
+    return (await db.execute(query)).scalars().all()
+
+
+def install(app):
+    """Replaces the sync handlers of the routes above with their async versions."""
+    replaced = {(route.path, method) for route in router.routes for method in route.methods}
+    app.router.routes = [
+        route for route in app.router.routes
+        if not (isinstance(route, APIRoute) and any((route.path, m) in replaced for m in route.methods))
+    ]
+    app.include_router(router)
@@ -0,0 +1,127 @@
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from loguru import logger
+
+# Derived artifacts (extracted pages, renders) live under backend/cache by default.
+CACHE_ROOT = os.getenv("CACHE_DIR", os.path.join(os.path.dirname(__file__), "cache"))
+
+
+class DiskCache:
+    """
+    Directory of generated files bounded by total size, evicting the least recently
+    used. Keys are file names (callers put every input of the content in the key, so
+    entries never need invalidation). Writes go to a temp file renamed into place, so
+    readers never see partial files and concurrent producers of one key are harmless.
+    Recency survives restarts through the files' mtime, refreshed on every hit.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries = None  # key -> size, oldest first; loaded from disk on first use
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _load(self):
+        # Caller holds the lock
+        if self._entries is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith(".part"):
+                stat = entry.stat()
+                found.append((stat.st_mtime, entry.name, stat.st_size))
+        self._entries = OrderedDict((name, size) for _, name, size in sorted(found))
+        self.current_bytes = sum(self._entries.values())
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def get(self, key: str):
+        """
+        Contents of the cached file, or None. The file is opened while its entry is held
+        under the lock, so a concurrent put evicting it cannot pull it away mid-read
+        (callers get bytes, never a path that may be gone by the time it is served).
+        """
+        with self._lock:
+            self._load()
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            try:
+                f = open(self.path(key), "rb")
+            except FileNotFoundError:  # removed behind our back
+                self.current_bytes -= self._entries.pop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        with f:
+            data = f.read()
+        try:
+            os.utime(self.path(key))
+        except OSError:  # evicted meanwhile; the data read is still good
+            pass
+        return data
+
+    def put(self, key: str, data: bytes) -> str:
+        """Stores data under key (evicting old entries if needed) and returns its path."""
+        with self._lock:
+            self._load()
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        path = self.path(key)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self.current_bytes -= self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self.current_bytes += len(data)
+            stale = []
+            while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+                oldest, size = self._entries.popitem(last=False)
+                self.current_bytes -= size
+                self.evictions += 1
+                stale.append(oldest)
+        for name in stale:
+            try:
+                os.remove(self.path(name))
+            except OSError:  # already gone, or still open by a reader (Windows)
+                pass
+        if stale:
+            logger.debug(f"Cache {os.path.basename(self.directory)}: {len(stale)} arquivos removidos (LRU)")
+        return path
+
+    def get_or_create(self, key: str, produce) -> bytes:
+        """Cached contents for key, calling produce() -> bytes on a miss."""
+        data = self.get(key)
+        if data is None:
+            start = time.perf_counter()
+            data = produce()
+            self.put(key, data)
+            logger.debug(f"Cache {os.path.basename(self.directory)}: {key} gerado em "
+                         f"{(time.perf_counter() - start) * 1000:.0f} ms ({len(data)} bytes)")
+        return data
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._load()
+            total = self.hits + self.misses
+            return {
+                "entradas": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
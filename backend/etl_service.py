@@ -1,10 +1,25 @@
-
+import os
 import pandas as pd
 import re
+from openpyxl import load_workbook
+from loguru import logger
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 from .models import Processo, EvidenciaMapeada, EvidenciaCatalogada
+from . import evidencia_service
 from datetime import datetime
 
+# Rows per bulk INSERT round
+INSERT_CHUNK_SIZE = 1000
+
+# Sheets above this size are streamed row by row (openpyxl read_only) in fixed-size
+# batches instead of loaded whole with pd.read_excel, keeping worker memory flat
+STREAMING_MIN_BYTES = int(os.getenv("ETL_STREAMING_MIN_BYTES", 20 * 1024 * 1024))
+STREAMING_BATCH_ROWS = int(os.getenv("ETL_STREAMING_BATCH_ROWS", 5000))
+
+# First number, optionally followed by a second one: "fls. 10", "fls. 10/12", "Pág. 5-7"
+REFERENCE_PATTERN = r'(\d+)(?:\D+(\d+))?'
+
 def parse_reference(ref: str):
     """
     Parses a reference string to extract start and end page numbers.
@@ -16,26 +31,36 @@ def parse_reference(ref: str):
     """
     if not isinstance(ref, str):
         return None, None
-    
+
     # Clean string
     ref = ref.lower().strip()
-    
+
     # Extract all numbers
     numbers = [int(n) for n in re.findall(r'\d+', ref)]
-    
+
     if not numbers:
         return None, None
-    
+
     if len(numbers) == 1:
         return numbers[0], numbers[0]
-    
+
     if len(numbers) >= 2:
         # Check if it's likely a range (sequential or close)
         # For now, simply take the first two as start/end
         return numbers[0], numbers[1]
-    
+
     return None, None
 
+def parse_references(refs: pd.Series):
+    """
+    Vectorized parse_reference: returns (pagina_inicial, pagina_final) as object
+    Series holding ints or None.
+    """
+    extracted = refs.astype(object).map(str).str.extract(REFERENCE_PATTERN)
+    pg_ini = pd.to_numeric(extracted[0]).astype("Int64")
+    pg_fim = pd.to_numeric(extracted[1]).astype("Int64").fillna(pg_ini)
+    return _nullable(pg_ini), _nullable(pg_fim)
+
 def clean_row_data(row_dict):
     cleaned = {}
     for k, v in row_dict.items():
@@ -47,88 +72,199 @@ def clean_row_data(row_dict):
             cleaned[k] = v
     return cleaned
 
-def import_mapeamento(db: Session, processo_id: int, file_path: str):
+def _to_isoformat(value):
+    return value.isoformat() if isinstance(value, (pd.Timestamp, datetime)) else value
+
+def _nullable(series: pd.Series) -> pd.Series:
+    """Object Series with NaN/NaT/<NA> replaced by None (what the DB driver expects)."""
+    series = series.astype(object)
+    return series.where(series.notna(), None)
+
+def clean_frame_data(df: pd.DataFrame):
+    """Vectorized clean_row_data: one JSON-ready dict per row, with dates as ISO strings."""
+    cleaned = pd.DataFrame(index=df.index)
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            series = series.dt.strftime("%Y-%m-%dT%H:%M:%S")
+        elif series.dtype == object:
+            series = series.map(_to_isoformat)
+        cleaned[col] = _nullable(series)
+    return cleaned.to_dict("records")
+
+def _column(df: pd.DataFrame, name: str) -> pd.Series:
+    """Column as object Series with None for blanks; all None if the column is missing."""
+    if name not in df.columns:
+        return pd.Series([None] * len(df), index=df.index, dtype=object)
+    return _nullable(df[name])
+
+def _text_column(df: pd.DataFrame, name: str) -> pd.Series:
+    """str(value) for filled cells, None for blanks (fiscal identifiers)."""
+    if name not in df.columns:
+        return pd.Series([None] * len(df), index=df.index, dtype=object)
+    series = df[name]
+    return series.astype(object).map(str).where(series.notna(), None)
+
+def _reference_column(df: pd.DataFrame, name: str) -> pd.Series:
+    """Same as str(row.get(name, '')): blanks become 'nan', a missing column becomes ''."""
+    if name not in df.columns:
+        return pd.Series([""] * len(df), index=df.index, dtype=object)
+    return df[name].astype(object).map(str)
+
+def _date_column(df: pd.DataFrame, name: str) -> pd.Series:
+    if name not in df.columns:
+        return pd.Series([None] * len(df), index=df.index, dtype=object)
+    series = df[name]
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return _nullable(series.dt.date.where(series.notna()))
+    return series.map(lambda v: v.date() if isinstance(v, datetime) else None).astype(object)
+
+def _bulk_insert(db: Session, table, records):
+    # executemany on a Core insert: SQLAlchemy renders it as multi-row VALUES batches
+    # with a cached statement, instead of compiling a new insert().values([...]) per chunk
+    insert_stmt = table.insert()
+    for start in range(0, len(records), INSERT_CHUNK_SIZE):
+        db.execute(insert_stmt, records[start:start + INSERT_CHUNK_SIZE])
+
+def mapeamento_records(df: pd.DataFrame, processo_id: int):
+    """Maps a Mapeamento sheet (already header-normalized) to evidencias_mapeadas rows."""
+    referencia = _reference_column(df, 'Referência')
+    pg_ini, pg_fim = parse_references(referencia)
+
+    columns = pd.DataFrame({
+        "processo_id": processo_id,
+        "tipo_evidencia": _column(df, 'Tipo de Evidência'),
+        "conteudo": _column(df, 'Conteúdo'),
+        "resumo": _column(df, 'Resumo'),
+        "trecho": _column(df, 'Trecho'),
+        "referencia_original": referencia,
+        "pagina_inicial": pg_ini,
+        "pagina_final": pg_fim,
+    }, index=df.index)
+    records = columns.to_dict("records")
+
+    # Full row data for JSON storage
+    for record, extra_data in zip(records, clean_frame_data(df)):
+        record["dados_extras"] = extra_data
+    return records
+
+def catalogador_records(df: pd.DataFrame, processo_id: int):
+    """Maps a Catalogador sheet (already header-normalized) to evidencias_catalogadas rows."""
+    referencia = _reference_column(df, 'referencia')
+    pg_ini, pg_fim = parse_references(referencia)
+
+    columns = pd.DataFrame({
+        "processo_id": processo_id,
+        "origem_tipo": _column(df, 'origem_tipo'),
+        "trecho": _column(df, 'trecho'),
+        "referencia_original": referencia,
+        "pagina_inicial": pg_ini,
+        "pagina_final": pg_fim,
+        # fiscal fields
+        "chave_nfe": _text_column(df, 'chave_nfe'),
+        "cnpj_emitente": _text_column(df, 'cnpj_emitente'),
+        "cnpj_destinatario": _text_column(df, 'cnpj_destinatario'),
+        "numero_nf": _text_column(df, 'numero_nf'),
+        "serie": _text_column(df, 'serie'),
+        "valor_total": _column(df, 'valor_total'),
+        "cfop": _text_column(df, 'cfop'),
+        "documento_ref": _text_column(df, 'documento_ref'),
+        "data_emissao": _date_column(df, 'data_emissao'),
+    }, index=df.index)
+    records = columns.to_dict("records")
+
+    # Full row data for JSON storage
+    for record, extra_data in zip(records, clean_frame_data(df)):
+        record["dados_extras"] = extra_data
+    return records
+
+def _convert_cell(value):
+    # Same as pd.read_excel: integral floats come back as int (e.g. 44-digit NF-e keys)
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+def _batch_frame(batch, columns) -> pd.DataFrame:
+    # Build as object first so big ints are not coerced back to float
+    return pd.DataFrame(batch, columns=columns, dtype=object).infer_objects()
+
+def iter_excel_frames(file_path: str, batch_rows: int = STREAMING_BATCH_ROWS):
+    """
+    Streams the first sheet of a workbook as DataFrames of at most batch_rows rows,
+    with headers already normalized. Only one batch is held in memory at a time.
+    """
+    wb = load_workbook(file_path, read_only=True, data_only=True)
     try:
-        df = pd.read_excel(file_path)
-    except Exception as e:
-        print(f"Error reading Mapeamento excel: {e}")
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        # Same naming as pd.read_excel for blank header cells
+        columns = [str(c).strip() if c is not None else f"Unnamed: {i}" for i, c in enumerate(header)]
+
+        batch = []
+        for row in rows:
+            # read_only mode may report phantom blank rows past the real data
+            if all(v is None for v in row):
+                continue
+            batch.append([_convert_cell(v) for v in row[:len(columns)]])
+            if len(batch) >= batch_rows:
+                yield _batch_frame(batch, columns)
+                batch = []
+        if batch:
+            yield _batch_frame(batch, columns)
+    finally:
+        wb.close()
+
+def read_excel_frames(file_path: str, streaming=None):
+    """
+    Yields the sheet as header-normalized DataFrames: a single frame from pd.read_excel,
+    or fixed-size batches when streaming (by default, for files above STREAMING_MIN_BYTES).
+    """
+    if streaming is None:
+        streaming = os.path.getsize(file_path) >= STREAMING_MIN_BYTES
+
+    if streaming:
+        yield from iter_excel_frames(file_path)
         return
 
+    df = pd.read_excel(file_path)
     # Normalize headers
     df.columns = [c.strip() for c in df.columns]
+    yield df
 
-    for _, row in df.iterrows():
-        tipo = row.get('Tipo de Evidência')
-        trecho = row.get('Trecho')
-        conteudo = row.get('Conteúdo')
-        resumo = row.get('Resumo')
-        ref = str(row.get('Referência', ''))
-
-        pg_ini, pg_fim = parse_reference(ref)
-
-        # Full row data for JSON storage
-        extra_data = clean_row_data(row.to_dict())
-
-        evidencia = EvidenciaMapeada(
-            processo_id=processo_id,
-            tipo_evidencia=tipo,
-            conteudo=conteudo,
-            resumo=resumo,
-            trecho=trecho,
-            referencia_original=ref,
-            pagina_inicial=pg_ini,
-            pagina_final=pg_fim,
-            dados_extras=extra_data
-        )
-        db.add(evidencia)
-    
-    db.commit()
-
-def import_catalogador(db: Session, processo_id: int, file_path: str):
+def _import_sheet(db: Session, processo_id: int, file_path: str, table, to_records, label: str,
+                  source_type: str, streaming=None) -> int:
+    total = 0
     try:
-        df = pd.read_excel(file_path)
+        for df in read_excel_frames(file_path, streaming):
+            records = to_records(df, processo_id)
+            _bulk_insert(db, table, records)
+            total += len(records)
+        # Same transaction: the listing sees the new rows only once fully materialized
+        evidencia_service.rebuild_unificadas(db, processo_id, source_type)
+        evidencia_service.rebuild_facetas(db, processo_id)
+        bump_data_version(db, processo_id)
     except Exception as e:
-        print(f"Error reading Catalogador excel: {e}")
-        return
+        # Nothing of this sheet is kept; the caller (ingestion job) records the failure
+        db.rollback()
+        logger.error(f"Falha ao importar a planilha {label} ({file_path}): {e}")
+        raise
 
-    df.columns = [c.strip() for c in df.columns]
-
-    for _, row in df.iterrows():
-        # Full row data for JSON storage
-        extra_data = clean_row_data(row.to_dict())
-
-        evidencia = EvidenciaCatalogada(
-            processo_id=processo_id,
-            origem_tipo=row.get('origem_tipo'),
-            trecho=row.get('trecho'),
-            referencia_original=str(row.get('referencia', '')),
-            # fiscal fields
-            chave_nfe=str(row.get('chave_nfe')) if pd.notna(row.get('chave_nfe')) else None,
-            cnpj_emitente=str(row.get('cnpj_emitente')) if pd.notna(row.get('cnpj_emitente')) else None,
-            cnpj_destinatario=str(row.get('cnpj_destinatario')) if pd.notna(row.get('cnpj_destinatario')) else None,
-            numero_nf=str(row.get('numero_nf')) if pd.notna(row.get('numero_nf')) else None,
-            serie=str(row.get('serie')) if pd.notna(row.get('serie')) else None,
-            valor_total=row.get('valor_total') if pd.notna(row.get('valor_total')) else None,
-            cfop=str(row.get('cfop')) if pd.notna(row.get('cfop')) else None,
-            documento_ref=str(row.get('documento_ref')) if pd.notna(row.get('documento_ref')) else None,
-            dados_extras=extra_data
-        )
-
-        # Parse reference
-        if evidencia.referencia_original:
-            pg_ini, pg_fim = parse_reference(evidencia.referencia_original)
-            evidencia.pagina_inicial = pg_ini
-            evidencia.pagina_final = pg_fim
-
-        # Date handling
-        dt_emissao = row.get('data_emissao')
-        if pd.notna(dt_emissao):
-            if isinstance(dt_emissao, datetime):
-                evidencia.data_emissao = dt_emissao.date()
-
-        db.add(evidencia)
-    
     db.commit()
+    return total
+
+def import_mapeamento(db: Session, processo_id: int, file_path: str, streaming=None) -> int:
+    return _import_sheet(db, processo_id, file_path, EvidenciaMapeada.__table__, mapeamento_records, "Mapeamento", "mapeada", streaming)
+
+def import_catalogador(db: Session, processo_id: int, file_path: str, streaming=None) -> int:
+    return _import_sheet(db, processo_id, file_path, EvidenciaCatalogada.__table__, catalogador_records, "Catalogador", "catalogada", streaming)
+
+def bump_data_version(db: Session, processo_id: int):
+    """Marks the process data as changed (invalidates its ETags). Does not commit."""
+    db.execute(
+        update(Processo).where(Processo.id == processo_id).values(data_version=Processo.data_version + 1)
+    )
 
 def create_processo(db: Session, numero: str, nome: str, pdf_path: str):
     processo = Processo(
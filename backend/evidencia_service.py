@@ -0,0 +1,428 @@
+import base64
+import json
+import math
+from collections import Counter
+from typing import Optional
+from loguru import logger
+from sqlalchemy import select, union_all, tuple_, and_, or_, func, case
+from sqlalchemy.orm import Session
+from .models import (EvidenciaMapeada, EvidenciaCatalogada, EvidenciaUnificadaMaterializada, EvidenciaFaceta,
+                     EvidenciaHistogramaPaginas)
+from .schemas import EvidenciaUnificada
+from . import search_service
+
+# The listing reads evidencias_unificadas, filled by the ETL with both evidence tables
+# already in the response shape (summary, type, fiscal fields, original_data).
+# Unified listing order: page, then mapeadas before catalogadas, then id.
+# The same key is the keyset cursor, so every page of results is one indexed range scan.
+# With a text query and order=relevance the first key is the evidence's BM25 rank within
+# its source instead of the page: each source has its own FTS table, whose scores are
+# not comparable (different corpus statistics), so the two rankings are interleaved.
+SOURCE_RANK = {"mapeada": 0, "catalogada": 1}
+ORDERS = ("pagina", "relevance")
+SOURCE_MODELS = {"mapeada": EvidenciaMapeada, "catalogada": EvidenciaCatalogada}
+INSERT_CHUNK_SIZE = 1000
+# Fields a listing can be projected to (fields=...): the EvidenciaUnificada schema
+PROJECTABLE_FIELDS = list(EvidenciaUnificada.model_fields)
+
+
+def encode_cursor(ordem, source_type: str, evidencia_id: int, order: str = "pagina") -> str:
+    raw = json.dumps([order, ordem, source_type, evidencia_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str, order: str = "pagina"):
+    """Returns (ordem, source_rank, id) or raises ValueError for a malformed cursor (or one of another order)."""
+    try:
+        cursor_order, ordem, source_type, evidencia_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if cursor_order != order:
+            raise ValueError(cursor_order)
+        ordem = int(ordem)
+        return ordem, SOURCE_RANK[source_type], int(evidencia_id)
+    except Exception:
+        raise ValueError("Cursor inválido.")
+
+
+# -- Materialization (ETL side) --
+
+def mapeada_to_unificada(item: EvidenciaMapeada) -> dict:
+    original_data = dict(item.dados_extras) if item.dados_extras else {}
+    original_data.update({
+        "referencia": item.referencia_original,
+        "trecho": item.trecho
+    })
+
+    return dict(
+        id=item.id,
+        source_type="mapeada",
+        tipo=item.tipo_evidencia,
+        resumo_conteudo=item.resumo or (item.conteudo or "")[:200], # Fallback
+        pagina_inicial=item.pagina_inicial,
+        pagina_final=item.pagina_final,
+        original_data=original_data
+    )
+
+
+def catalogada_to_unificada(item: EvidenciaCatalogada) -> dict:
+    original_data = dict(item.dados_extras) if item.dados_extras else {}
+    original_data.update({
+        "chave_nfe": item.chave_nfe,
+        "trecho": item.trecho
+    })
+
+    return dict(
+        id=item.id,
+        source_type="catalogada",
+        tipo=item.origem_tipo,
+        resumo_conteudo=f"NF: {item.numero_nf} - Valor: {item.valor_total}",
+        pagina_inicial=item.pagina_inicial,
+        pagina_final=item.pagina_final,
+        cnpj=item.cnpj_emitente,
+        data_emissao=item.data_emissao,
+        valor=item.valor_total,
+        original_data=original_data
+    )
+
+
+TO_UNIFICADA = {"mapeada": mapeada_to_unificada, "catalogada": catalogada_to_unificada}
+
+
+def source_query(processo_id: int, source_type: str):
+    """One processo's rows of a source table (read through ix_<table>_processo_pagina)."""
+    model = SOURCE_MODELS[source_type]
+    return select(model).where(model.processo_id == processo_id)
+
+
+def rebuild_unificadas(db: Session, processo_id: int, source_type: str) -> int:
+    """
+    Rewrites the evidencias_unificadas rows of one processo and source from the source
+    table. Does not commit: the ETL calls it inside the import transaction, so the
+    listing never sees a half-imported spreadsheet. Returns the number of rows written.
+    """
+    to_unificada = TO_UNIFICADA[source_type]
+    table = EvidenciaUnificadaMaterializada.__table__
+    insert = table.insert()
+
+    db.execute(table.delete().where(and_(
+        table.c.processo_id == processo_id, table.c.source_type == source_type
+    )))
+
+    total = 0
+    batch = []
+    source_rows = db.execute(
+        source_query(processo_id, source_type).execution_options(yield_per=INSERT_CHUNK_SIZE)
+    ).scalars()
+    for item in source_rows:
+        row = to_unificada(item)
+        row.update(
+            processo_id=processo_id,
+            source_rank=SOURCE_RANK[source_type],
+            ordem_pagina=item.pagina_inicial or 0,
+        )
+        batch.append(row)
+        if len(batch) >= INSERT_CHUNK_SIZE:
+            db.execute(insert, [_with_defaults(r) for r in batch])
+            total += len(batch)
+            batch = []
+    if batch:
+        db.execute(insert, [_with_defaults(r) for r in batch])
+        total += len(batch)
+    return total
+
+
+def _with_defaults(row: dict) -> dict:
+    # executemany needs the same keys in every row
+    row.setdefault("cnpj", None)
+    row.setdefault("data_emissao", None)
+    row.setdefault("valor", None)
+    return row
+
+
+def rebuild_all(db: Session) -> int:
+    """Backfills evidencias_unificadas for every processo (used by the migration)."""
+    total = 0
+    for source_type, model in SOURCE_MODELS.items():
+        processo_ids = db.execute(select(model.processo_id).distinct()).scalars().all()
+        for processo_id in processo_ids:
+            if processo_id is not None:
+                total += rebuild_unificadas(db, processo_id, source_type)
+    db.commit()
+    logger.info(f"Evidências unificadas reconstruídas: {total} linhas")
+    return total
+
+
+# -- Facets (ETL side: computed once per import, served as is) --
+
+HISTOGRAM_BUCKETS = 20
+COMPOUND_TYPE_SEPARATOR = "/"
+
+
+def split_tipo(tipo: str):
+    """"Procuração / Contrato" -> ["Procuração", "Contrato"]."""
+    return [part.strip() for part in tipo.split(COMPOUND_TYPE_SEPARATOR) if part.strip()]
+
+
+def histogram_bucket_width(max_pagina: int) -> int:
+    """Width giving at most HISTOGRAM_BUCKETS ranges, rounded up to 1, 2 or 5 x 10^k pages."""
+    raw = max(1, math.ceil(max_pagina / HISTOGRAM_BUCKETS))
+    magnitude = 10 ** (len(str(raw)) - 1)
+    for step in (1, 2, 5, 10):
+        if raw <= step * magnitude:
+            return step * magnitude
+
+
+def rebuild_facetas(db: Session, processo_id: int):
+    """
+    Recomputes the type facets and page histogram of a process from evidencias_unificadas
+    (both sources). Does not commit: runs inside the import transaction.
+    """
+    u = EvidenciaUnificadaMaterializada
+    facetas = EvidenciaFaceta.__table__
+    histograma = EvidenciaHistogramaPaginas.__table__
+    db.execute(facetas.delete().where(facetas.c.processo_id == processo_id))
+    db.execute(histograma.delete().where(histograma.c.processo_id == processo_id))
+
+    tipos = db.execute(
+        select(u.tipo, func.count()).where(u.processo_id == processo_id, u.tipo.isnot(None), u.tipo != "")
+        .group_by(u.tipo)
+    ).all()
+    componentes = Counter()
+    for tipo, quantidade in tipos:
+        for componente in set(split_tipo(tipo)):
+            componentes[componente] += quantidade
+
+    total, sem_pagina, max_pagina = db.execute(
+        select(func.count(), func.sum(case((u.ordem_pagina == 0, 1), else_=0)), func.max(u.ordem_pagina))
+        .where(u.processo_id == processo_id)
+    ).one()
+
+    rows = [{"processo_id": processo_id, "faceta": "tipo", "valor": t, "quantidade": n} for t, n in tipos]
+    rows += [{"processo_id": processo_id, "faceta": "tipo_componente", "valor": c, "quantidade": n}
+             for c, n in componentes.items()]
+    rows += [{"processo_id": processo_id, "faceta": "contagem", "valor": valor, "quantidade": n or 0}
+             for valor, n in (("total", total), ("sem_pagina", sem_pagina))]
+    db.execute(facetas.insert(), rows)
+
+    if max_pagina:
+        width = histogram_bucket_width(max_pagina)
+        bucket = ((u.ordem_pagina - 1) // width).label("bucket")
+        buckets = db.execute(
+            select(bucket, func.count()).where(u.processo_id == processo_id, u.ordem_pagina > 0).group_by(bucket)
+        ).all()
+        if buckets:
+            db.execute(histograma.insert(), [
+                {"processo_id": processo_id, "pagina_inicial": b * width + 1, "pagina_final": (b + 1) * width,
+                 "quantidade": n}
+                for b, n in buckets
+            ])
+
+
+def rebuild_all_facetas(db: Session):
+    """Backfills facets and histograms for every process (used by the migration)."""
+    processo_ids = db.execute(select(EvidenciaUnificadaMaterializada.processo_id).distinct()).scalars().all()
+    for processo_id in processo_ids:
+        rebuild_facetas(db, processo_id)
+    db.commit()
+
+
+def list_tipos(db: Session, processo_id: int):
+    """Distinct evidence types of a process, sorted (filter options)."""
+    return db.execute(
+        select(EvidenciaFaceta.valor)
+        .where(EvidenciaFaceta.processo_id == processo_id, EvidenciaFaceta.faceta == "tipo")
+        .order_by(EvidenciaFaceta.valor)
+    ).scalars().all()
+
+
+def get_facetas(db: Session, processo_id: int) -> dict:
+    """Type counts (as imported and split), totals and the page histogram of a process."""
+    facetas = db.execute(
+        select(EvidenciaFaceta.faceta, EvidenciaFaceta.valor, EvidenciaFaceta.quantidade)
+        .where(EvidenciaFaceta.processo_id == processo_id)
+    ).all()
+    grupos = {"tipo": [], "tipo_componente": []}
+    contagem = {}
+    for faceta, valor, quantidade in facetas:
+        if faceta == "contagem":
+            contagem[valor] = quantidade
+        else:
+            grupos[faceta].append({"valor": valor, "quantidade": quantidade})
+    for valores in grupos.values():
+        valores.sort(key=lambda f: (-f["quantidade"], f["valor"]))
+
+    paginas = db.execute(
+        select(EvidenciaHistogramaPaginas.pagina_inicial, EvidenciaHistogramaPaginas.pagina_final,
+               EvidenciaHistogramaPaginas.quantidade)
+        .where(EvidenciaHistogramaPaginas.processo_id == processo_id)
+        .order_by(EvidenciaHistogramaPaginas.pagina_inicial)
+    ).mappings().all()
+
+    return {
+        "total": contagem.get("total", 0),
+        "sem_pagina": contagem.get("sem_pagina", 0),
+        "tipos": grupos["tipo"],
+        "tipos_componentes": grupos["tipo_componente"],
+        "paginas": [dict(p) for p in paginas],
+    }
+
+
+# -- Listing --
+
+def _base_filters(processo_id: int, tipo, pg_min, pg_max):
+    u = EvidenciaUnificadaMaterializada
+    filters = [u.processo_id == processo_id]
+    if pg_min is not None:
+        filters.append(u.pagina_final >= pg_min)
+    if pg_max is not None:
+        filters.append(u.pagina_inicial <= pg_max)
+    if tipo:
+        # 'tipo' is tipo_evidencia for mapeadas and origem_tipo for catalogadas
+        filters.append(u.tipo.ilike(f"%{tipo}%"))
+    return filters
+
+
+def _text_matches(source_type: str, filters, match: str, order: str, q: str):
+    """
+    Keys of one source's evidences matching the text query, via that source's FTS index,
+    or where FTS5 is not available, ILIKE on the same columns (every term in any of them).
+    """
+    u = EvidenciaUnificadaMaterializada
+    model = SOURCE_MODELS[source_type]
+    source_table = model.__tablename__
+    if not search_service.FTS_AVAILABLE:
+        columns = [model.__table__.c[name] for name in search_service.EVIDENCE_FTS_COLUMNS[source_table]]
+        terms = [or_(*[c.ilike(f"%{term}%") for c in columns]) for term in search_service.search_terms(q)]
+        return (
+            select(u.source_type, u.id, u.ordem_pagina.label("ordem"))
+            .join(model.__table__, model.__table__.c.id == u.id)
+            .where(u.source_type == source_type, *terms, *filters)
+        )
+    fts = search_service.evidence_fts_table(source_table)
+    if order == "relevance":
+        # 1 = best match of this source (see SOURCE_RANK for the interleaving)
+        ordem = func.row_number().over(order_by=(search_service.evidence_fts_rank(source_table), u.id))
+    else:
+        ordem = u.ordem_pagina
+    return (
+        select(u.source_type, u.id, ordem.label("ordem"))
+        .join(fts, fts.c.rowid == u.id)
+        .where(u.source_type == source_type, search_service.evidence_fts_match(source_table, match), *filters)
+    )
+
+
+def parse_fields(fields: Optional[str]):
+    """
+    Validates a comma-separated `fields=` projection. Returns the column names to select
+    (id and source_type always included, as they address the detail endpoint), or None
+    for the full shape. Raises ValueError for unknown fields.
+    """
+    if not fields:
+        return None
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in names if f not in PROJECTABLE_FIELDS]
+    if unknown:
+        raise ValueError(f"Campos inválidos: {', '.join(unknown)}. Disponíveis: {', '.join(PROJECTABLE_FIELDS)}.")
+    return ["id", "source_type"] + [f for f in dict.fromkeys(names) if f not in ("id", "source_type")]
+
+
+def unified_query(processo_id: int, tipo=None, pg_min=None, pg_max=None, q=None,
+                  cursor: Optional[str] = None, limit: Optional[int] = None, order: str = "pagina",
+                  columns=None):
+    """
+    One query over evidencias_unificadas sorted by (page or score, source, id). Each row is
+    (entity, ordem), or the requested `columns` plus "ordem" when projecting.
+    Without a text query it is a range scan of the (processo, page, source, id) index.
+    The text query runs on the evidence FTS indexes (accent-insensitive, prefix terms),
+    or as ILIKE filters on the same columns where FTS5 is not available.
+    """
+    u = EvidenciaUnificadaMaterializada
+    selected = [u] if columns is None else [getattr(u, c) for c in columns]
+    filters = _base_filters(processo_id, tipo, pg_min, pg_max)
+    match = search_service.build_match_query(q, prefix=True) if q else ""
+    if not match or not search_service.FTS_AVAILABLE:
+        order = "pagina"  # no text query, or no FTS5 (server database): nothing to rank by
+
+    if match:
+        keys = union_all(
+            _text_matches("mapeada", filters, match, order, q),
+            _text_matches("catalogada", filters, match, order, q),
+        ).subquery()
+        ordem = keys.c.ordem
+        query = select(*selected, ordem).join(keys, and_(u.source_type == keys.c.source_type, u.id == keys.c.id))
+        query = query.where(u.processo_id == processo_id)
+    else:
+        ordem = u.ordem_pagina
+        query = select(*selected, ordem.label("ordem")).where(*filters)
+
+    if cursor:
+        query = query.where(tuple_(ordem, u.source_rank, u.id) > tuple_(*decode_cursor(cursor, order)))
+    query = query.order_by(ordem, u.source_rank, u.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query, order
+
+
+def prepare_listing(processo_id: int, tipo=None, pg_min=None, pg_max=None, q=None,
+                    cursor: Optional[str] = None, limit: Optional[int] = None, order: str = "pagina",
+                    fields: Optional[str] = None):
+    """
+    Validates the listing parameters and builds its select (one row more than `limit`,
+    to detect a next page). Returns (query, order, columns) for finish_listing.
+    Raises ValueError for an invalid order, cursor or fields.
+    """
+    if order not in ORDERS:
+        raise ValueError(f"Ordenação inválida: use {' ou '.join(ORDERS)}.")
+    columns = parse_fields(fields)
+    query, order = unified_query(processo_id, tipo, pg_min, pg_max, q, cursor,
+                                 limit + 1 if limit is not None else None, order, columns)
+    return query, order, columns
+
+
+def finish_listing(rows, order: str, columns, limit: Optional[int]):
+    """Turns the listing rows into (evidences, next_cursor)."""
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        if columns is None:
+            next_cursor = encode_cursor(last.ordem, last[0].source_type, last[0].id, order)
+        else:
+            next_cursor = encode_cursor(last.ordem, last.source_type, last.id, order)
+
+    if columns is None:
+        return [row[0] for row in rows], next_cursor
+    return [{c: row[i] for i, c in enumerate(columns)} for row in rows], next_cursor
+
+
+def list_unificadas(db: Session, processo_id: int, tipo=None, pg_min=None, pg_max=None, q=None,
+                    cursor: Optional[str] = None, limit: Optional[int] = None, order: str = "pagina",
+                    fields: Optional[str] = None):
+    """
+    Returns (evidences, next_cursor). Without limit, returns every match (next_cursor is None).
+    With limit, returns at most `limit` items and the cursor for the following page, if any.
+    order="relevance" sorts text query matches by BM25 rank within each source (best
+    first, sources interleaved); otherwise by page.
+    With `fields`, evidences are plain dicts holding only those columns (see parse_fields).
+    """
+    query, order, columns = prepare_listing(processo_id, tipo, pg_min, pg_max, q, cursor, limit, order, fields)
+    return finish_listing(db.execute(query).all(), order, columns, limit)
+
+
+async def list_unificadas_async(db, processo_id: int, tipo=None, pg_min=None, pg_max=None, q=None,
+                                cursor: Optional[str] = None, limit: Optional[int] = None, order: str = "pagina",
+                                fields: Optional[str] = None):
+    """list_unificadas on an AsyncSession (same query)."""
+    query, order, columns = prepare_listing(processo_id, tipo, pg_min, pg_max, q, cursor, limit, order, fields)
+    rows = (await db.execute(query)).all()
+    return finish_listing(rows, order, columns, limit)
+
+
+def get_unificada(db: Session, source_type: str, evidencia_id: int) -> Optional[EvidenciaUnificadaMaterializada]:
+    """Full evidence (with original_data) by source and id, for on-demand detail loading."""
+    return db.get(EvidenciaUnificadaMaterializada, (source_type, evidencia_id))
+
+
+def highlight_text(evidencia: EvidenciaUnificadaMaterializada) -> str:
+    """Text of an evidence to locate on its page: the excerpt, else the summary."""
+    original = evidencia.original_data or {}
+    return original.get("trecho") or original.get("conteudo") or evidencia.resumo_conteudo or ""
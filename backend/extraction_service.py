@@ -0,0 +1,54 @@
+import math
+import os
+
+import pymupdf
+
+from .process_pool import get_pool, PROCESS_WORKERS
+from .text_service import PDF_PAGE_MARKER
+
+# Text of the PDF itself, for processes uploaded without a pre-extracted .txt. Pages are
+# extracted with PyMuPDF on the shared process pool, sharded by page range (each task
+# opens the PDF once and returns the texts of its pages), and written in page order to
+# one UTF-8 file separated by PDF_PAGE_MARKER. Stored like an uploaded text (see
+# pdf_service.extract_processo_text), it is read by the page index, page cache,
+# full-text search and chat like any other.
+# This module only imports what the workers need (they are spawned, not forked).
+EXTRACT_SHARD_PAGES = int(os.getenv("EXTRACT_SHARD_PAGES", 64))  # max pages per pool task
+
+
+def extract_range(pdf_path: str, inicio: int, fim: int):
+    """Worker: texts of pages inicio..fim (1-based, inclusive), in order."""
+    texts = []
+    with pymupdf.open(pdf_path) as doc:
+        for page in doc.pages(inicio - 1, fim):
+            # The marker must only ever separate pages
+            texts.append(page.get_text("text").replace(PDF_PAGE_MARKER, "\n"))
+    return texts
+
+
+def shards(total: int, workers: int = PROCESS_WORKERS):
+    """Page ranges [(inicio, fim)] covering 1..total, at least two per worker when the document allows."""
+    size = max(1, min(EXTRACT_SHARD_PAGES, math.ceil(total / (2 * workers))))
+    return [(inicio, min(inicio + size - 1, total)) for inicio in range(1, total + 1, size)]
+
+
+def extract_text(pdf_path: str, out) -> int:
+    """
+    Writes the text of every page of the PDF to the binary file `out`, pages separated
+    by PDF_PAGE_MARKER (blank pages included). Returns the number of pages.
+    """
+    with pymupdf.open(pdf_path) as doc:
+        total = doc.page_count
+    pool = get_pool()
+    futures = [pool.submit(extract_range, pdf_path, inicio, fim) for inicio, fim in shards(total)]
+    marker = PDF_PAGE_MARKER.encode("utf-8")
+    pagina = 0
+    # Shards finish in any order but are written in submission (page) order
+    for future in futures:
+        for text in future.result():
+            if pagina:
+                out.write(marker)
+            out.write(text.encode("utf-8"))
+            pagina += 1
+    return pagina
+
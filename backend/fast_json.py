@@ -0,0 +1,52 @@
+import json
+import os
+from datetime import date, datetime
+from decimal import Decimal
+from fastapi.responses import Response
+from sqlalchemy import select
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the stdlib encoder (same output, slower)
+    orjson = None
+
+# Opt-in fast path for the heavy list endpoints: rows are selected straight from SQL
+# (no ORM objects, no pydantic validation) and serialized in one pass with orjson.
+# Output matches the response_model path: Decimal as string, date/datetime in ISO format.
+ENABLED = os.getenv("FAST_JSON_RESPONSES", "0").lower() in ("1", "true", "yes")
+
+
+def _default(obj):
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, (date, datetime)):
+        return obj.isoformat()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(content, default=_default)
+        except TypeError:
+            # orjson rejects integers beyond 64 bits (e.g. 44-digit NF-e keys read as numbers
+            # from a spreadsheet) without calling default; the stdlib encoder handles them
+            pass
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def schema_select(model, schema):
+    """select() of the model columns named like the schema fields, in schema order."""
+    return select(*[model.__table__.c[name] for name in schema.model_fields])
+
+
+def rows(db, query):
+    """Runs a Core select and returns plain dicts."""
+    return [dict(row) for row in db.execute(query).mappings()]
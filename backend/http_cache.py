@@ -0,0 +1,34 @@
+import hashlib
+from fastapi import Request
+from fastapi.responses import Response
+
+# Conditional GET for read endpoints whose body is a pure function of a process'
+# data_version (plus the request parameters). The ETag is computed before any heavy
+# query, so a client revalidating an unchanged list costs one primary-key lookup.
+# Bump ETAG_SALT when a response shape changes, so cached bodies are not reused.
+ETAG_SALT = "1"
+CACHE_CONTROL = "private, no-cache"  # clients may store, but must revalidate
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha1(repr((ETAG_SALT,) + parts).encode("utf-8")).hexdigest()
+    return f'"{digest[:20]}"'
+
+
+def is_fresh(request: Request, etag: str) -> bool:
+    """If-None-Match check (weak comparison, as RFC 9110 prescribes for GET)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [c.strip() for c in header.split(",")]
+    return any(c.removeprefix("W/") == etag for c in candidates)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+def validator_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
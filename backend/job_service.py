@@ -0,0 +1,159 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from loguru import logger
+from sqlalchemy.orm import Session
+from .database import SessionLocal
+from .models import JobIngestao, Processo
+from . import etl_service, text_service, search_service, pdf_service, render_service, storage_service, word_index_service
+
+# Ingestion (text indexes + spreadsheet ETL) runs off the request path on a
+# small, bounded pool so big uploads never hold an API worker.
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 2))
+
+_executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingestao")
+
+
+def enqueue_ingestion(db: Session, processo_id: int, parametros: dict) -> JobIngestao:
+    """
+    Persists a queued job and hands it to the worker pool.
+    parametros: {'texto': path, 'mapeamento': path, 'catalogador': path, 'extrair_texto': bool,
+    'linearizar_pdf': bool, 'palavras_pdf': bool, 'miniaturas': bool} (all optional).
+    """
+    job = JobIngestao(processo_id=processo_id, status="queued", parametros=parametros)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    _executor.submit(run_ingestion, job.id)
+    logger.info(f"Job de ingestão {job.id} enfileirado para processo {processo_id}")
+    return job
+
+
+def _set_stage(db: Session, job: JobIngestao, etapa: str):
+    job.etapa = etapa
+    db.commit()
+
+
+def _release_sheets(db: Session, parametros: dict):
+    # The spreadsheets only matter to the import: their rows now live in the database
+    for chave in ("mapeamento", "catalogador"):
+        if parametros.get(chave):
+            storage_service.release(db, storage_service.stored_path(parametros[chave]))
+
+
+def run_ingestion(job_id: int):
+    """Worker entry point: runs every step of the job in its own DB session."""
+    db = SessionLocal()
+    try:
+        # Atomic claim: only one worker (or server process) runs a queued job
+        claimed = db.query(JobIngestao).filter(
+            JobIngestao.id == job_id, JobIngestao.status == "queued"
+        ).update({"status": "running", "iniciado_em": datetime.utcnow()})
+        db.commit()
+        if not claimed:
+            return
+        job = db.query(JobIngestao).filter(JobIngestao.id == job_id).first()
+        started = time.perf_counter()
+
+        try:
+            processo = db.query(Processo).filter(Processo.id == job.processo_id).first()
+            parametros = job.parametros or {}
+
+            # Text first: it is what the chat and page text endpoints need
+            txt_path = parametros.get("texto")
+            # Never over a text file uploaded by the user
+            replaceable = processo.caminho_texto is None or processo.marcador_pagina == text_service.PDF_PAGE_MARKER
+            if parametros.get("extrair_texto") and not txt_path and replaceable:
+                _set_stage(db, job, "extraindo texto do PDF")
+                try:
+                    txt_path = pdf_service.extract_processo_text(db, processo.id)
+                except Exception:
+                    # The process stays without text (no chat), as before this step existed
+                    db.rollback()
+                    logger.exception(f"Falha ao extrair o texto do PDF do processo {processo.id}")
+                db.refresh(processo)
+
+            if txt_path and processo.marcador_pagina:
+                _set_stage(db, job, "indexando texto")
+                text_service.build_page_index(txt_path, processo.marcador_pagina)
+                search_service.index_text(db, txt_path, processo.marcador_pagina)
+
+            if parametros.get("linearizar_pdf"):
+                _set_stage(db, job, "otimizando PDF")
+                try:
+                    pdf_service.linearize_processo_pdf(db, processo.id)
+                except Exception:
+                    # Only an optimization: the PDF is still served as uploaded
+                    db.rollback()
+                    logger.exception(f"Falha ao linearizar o PDF do processo {processo.id}")
+
+            if parametros.get("palavras_pdf"):
+                _set_stage(db, job, "indexando palavras do PDF")
+                try:
+                    db.refresh(processo)  # caminho_pdf may have been linearized above
+                    word_index_service.build_index(storage_service.real_path(processo.caminho_pdf))
+                except Exception:
+                    # Highlights fall back to reading the page from the PDF
+                    logger.exception(f"Falha ao indexar as palavras do PDF do processo {processo.id}")
+
+            if parametros.get("mapeamento"):
+                _set_stage(db, job, "importando mapeamento")
+                job.linhas_importadas += etl_service.import_mapeamento(db, processo.id, parametros["mapeamento"])
+                db.commit()
+
+            if parametros.get("catalogador"):
+                _set_stage(db, job, "importando catalogador")
+                job.linhas_importadas += etl_service.import_catalogador(db, processo.id, parametros["catalogador"])
+                db.commit()
+
+            if parametros.get("miniaturas"):
+                # Last: previews are a convenience, the data above comes first
+                _set_stage(db, job, "gerando miniaturas")
+                try:
+                    db.refresh(processo)  # caminho_pdf may have been linearized above
+                    pdf_path = storage_service.real_path(processo.caminho_pdf)
+                    render_service.prerender(pdf_path, pdf_service.content_version(processo.caminho_pdf, pdf_path))
+                except Exception:
+                    logger.exception(f"Falha ao gerar miniaturas do processo {processo.id}")
+
+            job.status = "done"
+            job.etapa = None
+        except Exception as e:
+            db.rollback()
+            logger.exception(f"Falha no job de ingestão {job_id}")
+            job.status = "failed"
+            job.erro = str(e)
+
+        _release_sheets(db, job.parametros or {})
+        job.finalizado_em = datetime.utcnow()
+        job.duracao_segundos = round(time.perf_counter() - started, 3)
+        db.commit()
+        logger.info(f"Job de ingestão {job_id}: {job.status} ({job.linhas_importadas} linhas em {job.duracao_segundos}s)")
+    finally:
+        db.close()
+
+
+def resume_pending_jobs():
+    """
+    Called at startup. Queued jobs are resubmitted; jobs that were running when the
+    server stopped are marked failed (their imports may be partial) and their
+    spreadsheets released.
+    """
+    db = SessionLocal()
+    try:
+        interrupted = db.query(JobIngestao).filter(JobIngestao.status == "running").all()
+        for job in interrupted:
+            job.status = "failed"
+            job.erro = "Interrompido por reinício do servidor."
+            job.finalizado_em = datetime.utcnow()
+            _release_sheets(db, job.parametros or {})
+        db.commit()
+
+        pending = db.query(JobIngestao.id).filter(JobIngestao.status == "queued").all()
+        for (job_id,) in pending:
+            _executor.submit(run_ingestion, job_id)
+        if pending or interrupted:
+            logger.info(f"Jobs de ingestão: {len(pending)} retomados, {len(interrupted)} marcados como falhos")
+    finally:
+        db.close()
@@ -1,24 +1,37 @@
 
-from fastapi import FastAPI, Depends, HTTPException, Query, UploadFile, File, Form, status
+from fastapi import FastAPI, Depends, HTTPException, Query, UploadFile, File, Form, Header, Request, status
+from fastapi.responses import JSONResponse, Response, FileResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordRequestForm
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
 from typing import List, Optional
 from datetime import timedelta
-import shutil
+from contextlib import asynccontextmanager
 import os
 from .database import get_db, engine, Base
-from .models import Processo, EvidenciaMapeada, EvidenciaCatalogada, Usuario, ChatSession, ChatMessage
-from .schemas import ProcessoSchema, EvidenciaUnificada, Token, UsuarioCreate, UsuarioDisplay, ChatSessionSchema, ChatSessionCreate, ChatMessageSchema, ChatMessageCreate, ChatSessionInit
-from . import auth, etl_service, text_service, chat_service
+from .models import Processo, Usuario, ChatSession, ChatMessage, JobIngestao
+from .schemas import ProcessoSchema, EvidenciaUnificada, Token, UsuarioCreate, UsuarioDisplay, ChatSessionSchema, ChatSessionCreate, ChatMessageSchema, ChatMessageCreate, ChatSessionInit, JobIngestaoSchema, UploadInit, UploadParcialSchema, FacetasSchema
+from . import auth, migrate_db, etl_service, chat_service, process_pool, search_service, job_service, storage_service, upload_service, evidencia_service, fast_json, http_cache, read_service, database, async_api, pdf_service, render_service, word_index_service
+from .page_cache import page_cache
 import uvicorn
 
-# Create tables if they don't exist (helpful for auto-init)
-Base.metadata.create_all(bind=engine)
-
-app = FastAPI(title="Leitor Inteligente API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup work lives here, not at import time: spawned pool workers re-import the
+    # main module and must never touch the database (resume_pending_jobs would mark the
+    # running jobs as failed). Create tables if they don't exist (helpful for auto-init)
+    Base.metadata.create_all(bind=engine)
+    migrate_db.migrate(engine)
+    search_service.ensure_schema(engine)
+    job_service.resume_pending_jobs()
+    upload_service.expire_uploads()
+    yield
+    # PDF rendering / extraction workers
+    process_pool.shutdown()
+
+app = FastAPI(title="Leitor Inteligente API", lifespan=lifespan)
 
 # CORS
 app.add_middleware(
@@ -81,95 +94,170 @@ def create_user(user: UsuarioCreate, db: Session = Depends(get_db), current_user
 # -- Process Endpoints --
 
 @app.post("/processos")
-def create_processo_completo(
+async def create_processo_completo(
     numero: str = Form(...),
     nome: str = Form(...),
     marcador_pagina: Optional[str] = Form(None),
-    file_pdf: UploadFile = File(...),
+    file_pdf: Optional[UploadFile] = File(None),
+    upload_pdf_id: Optional[str] = Form(None), # Finalized chunked upload (see /uploads), instead of file_pdf
     file_mapeamento: Optional[UploadFile] = File(None),
     file_catalogador: Optional[UploadFile] = File(None),
     file_texto: Optional[UploadFile] = File(None),
     db: Session = Depends(get_db),
     # current_user: Usuario = Depends(auth.get_current_active_user)
 ):
+    if not file_pdf and not upload_pdf_id:
+        raise HTTPException(status_code=400, detail="Envie o PDF (file_pdf) ou o id de um upload em partes (upload_pdf_id).")
+
+    # Save uploads by content (sha256): identical files are stored once.
+    # Async path: chunks are hashed/written on the upload I/O threads, not the request threadpool.
+    if upload_pdf_id:
+        pdf = await storage_service.run_io(upload_service.consume_upload, db, upload_pdf_id, ".pdf")
+    else:
+        pdf = await storage_service.save_upload_async(db, file_pdf, ".pdf")
+    texto = await storage_service.save_upload_async(db, file_texto, ".txt") if file_texto else None
+    mapeamento = await storage_service.save_upload_async(db, file_mapeamento, ".xlsx") if file_mapeamento else None
+    catalogador = await storage_service.save_upload_async(db, file_catalogador, ".xlsx") if file_catalogador else None
+
+    return await storage_service.run_io(
+        _register_processo, db, numero, nome, marcador_pagina, pdf, texto, mapeamento, catalogador
+    )
+
+def _register_processo(db: Session, numero, nome, marcador_pagina, pdf, texto, mapeamento, catalogador):
     # Create Process
     processo = Processo(
         numero_processo=numero, 
         nome_descricao=nome, 
-        caminho_pdf="",
+        caminho_pdf=pdf.caminho,
+        caminho_texto=texto.caminho if texto else None,
         marcador_pagina=marcador_pagina
     )
     db.add(processo)
     db.commit()
     db.refresh(processo)
 
-    # Ensure uploads dir exists
-    uploads_dir = os.path.join(static_dir, "uploads")
-    if not os.path.exists(uploads_dir):
-        os.makedirs(uploads_dir)
-
-    # Save PDF
-    pdf_path = os.path.join(uploads_dir, f"{processo.id}.pdf")
-    with open(pdf_path, "wb") as buffer:
-        shutil.copyfileobj(file_pdf.file, buffer)
+    # Text extraction (when no .txt was sent), PDF linearization, text indexes and
+    # spreadsheet ETL run in the background; poll /jobs/{job_id}
+    parametros = {"extrair_texto": True, "linearizar_pdf": True, "palavras_pdf": True, "miniaturas": True}
+    if texto:
+        parametros["texto"] = storage_service.real_path(texto.caminho)
+    if mapeamento:
+        parametros["mapeamento"] = storage_service.real_path(mapeamento.caminho)
+    if catalogador:
+        parametros["catalogador"] = storage_service.real_path(catalogador.caminho)
+    job = job_service.enqueue_ingestion(db, processo.id, parametros)
     
-    processo.caminho_pdf = f"uploads/{processo.id}.pdf"
-    
-    # Save Text File if provided
-    if file_texto:
-        txt_path = os.path.join(uploads_dir, f"{processo.id}_full.txt")
-        with open(txt_path, "wb") as buffer:
-            shutil.copyfileobj(file_texto.file, buffer)
-        processo.caminho_texto = f"uploads/{processo.id}_full.txt"
+    return {"message": "Processo criado com sucesso", "id": processo.id, "job_id": job.id}
 
-    db.commit()
 
-    # Process Excels
-    if file_mapeamento:
-        map_path = os.path.join(uploads_dir, f"{processo.id}_mapeamento.xlsx")
-        with open(map_path, "wb") as buffer:
-            shutil.copyfileobj(file_mapeamento.file, buffer)
-        etl_service.import_mapeamento(db, processo.id, map_path)
-    
-    if file_catalogador:
-        cat_path = os.path.join(uploads_dir, f"{processo.id}_catalogador.xlsx")
-        with open(cat_path, "wb") as buffer:
-            shutil.copyfileobj(file_catalogador.file, buffer)
-        etl_service.import_catalogador(db, processo.id, cat_path)
+@app.post("/processos/{processo_id}/upload")
+async def upload_pdf(
+    processo_id: int,
+    file: Optional[UploadFile] = File(None),
+    upload_id: Optional[str] = Form(None), # Finalized chunked upload (see /uploads), instead of file
+    db: Session = Depends(get_db)
+):
+    processo = await storage_service.run_io(_get_processo_or_404, db, processo_id)
+    if not file and not upload_id:
+        raise HTTPException(status_code=400, detail="Envie o arquivo (file) ou o id de um upload em partes (upload_id).")
     
-    return {"message": "Processo criado com sucesso", "id": processo.id}
+    # Save file by content
+    if upload_id:
+        pdf = await storage_service.run_io(upload_service.consume_upload, db, upload_id, ".pdf")
+    else:
+        pdf = await storage_service.save_upload_async(db, file, ".pdf")
 
+    caminho = await storage_service.run_io(_replace_pdf, db, processo, pdf)
+    return {"filename": file.filename if file else upload_id, "path": caminho}
 
-@app.post("/processos/{processo_id}/upload")
-def upload_pdf(processo_id: int, file: UploadFile = File(...), db: Session = Depends(get_db)):
+def _get_processo_or_404(db: Session, processo_id: int) -> Processo:
     processo = db.query(Processo).filter(Processo.id == processo_id).first()
     if not processo:
         raise HTTPException(status_code=404, detail="Process not found")
-    
-    # Ensure uploads dir exists
-    uploads_dir = os.path.join(static_dir, "uploads")
-    if not os.path.exists(uploads_dir):
-        os.makedirs(uploads_dir)
-    
-    # Save file
-    file_location = os.path.join(uploads_dir, f"{processo_id}.pdf")
-    with open(file_location, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-        
+    return processo
+
+def _replace_pdf(db: Session, processo: Processo, pdf) -> str:
+    anterior = processo.caminho_pdf
     # Update DB path (relative URL for frontend)
-    # We serve backend/static at /static. So backend/static/uploads/1.pdf is /static/uploads/1.pdf
-    processo.caminho_pdf = f"uploads/{processo_id}.pdf"
+    # We serve backend/static at /static. So backend/static/uploads/cas/ab/ab12...pdf is /static/uploads/cas/ab/ab12...pdf
+    processo.caminho_pdf = pdf.caminho
+    etl_service.bump_data_version(db, processo.id)
     db.commit()
-    db.refresh(processo)
-    
-    return {"filename": file.filename, "path": processo.caminho_pdf}
+    # Drop the reference to the PDF it replaces
+    # (same bytes uploaded again: the new reference and the released one cancel out)
+    storage_service.release(db, anterior)
+    job_service.enqueue_ingestion(db, processo.id, {"extrair_texto": True, "linearizar_pdf": True, "palavras_pdf": True, "miniaturas": True})
+    return pdf.caminho
+
+# -- Chunked Upload Endpoints --
+# Resumable protocol for large files: POST /uploads -> PUT /uploads/{id}?offset=N (raw bytes,
+# optional X-Chunk-SHA256) -> POST /uploads/{id}/finalizar. GET /uploads/{id} tells a client
+# where to resume. The finalized id is then passed as upload_pdf_id / upload_id.
+
+@app.exception_handler(upload_service.UploadError)
+async def upload_error_handler(request: Request, exc: upload_service.UploadError):
+    return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail})
+
+@app.post("/uploads", response_model=UploadParcialSchema)
+def init_upload(payload: UploadInit, db: Session = Depends(get_db)):
+    return upload_service.create_upload(db, payload.nome_arquivo, payload.tamanho_total, payload.sha256)
+
+@app.get("/uploads/{upload_id}", response_model=UploadParcialSchema)
+def get_upload_status(upload_id: str, db: Session = Depends(get_db)):
+    return upload_service.get_upload(db, upload_id)
+
+@app.put("/uploads/{upload_id}", response_model=UploadParcialSchema)
+async def put_upload_chunk(
+    upload_id: str,
+    offset: int,
+    request: Request,
+    x_chunk_sha256: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    content_length = int(request.headers.get("content-length") or 0)
+    if content_length > upload_service.MAX_CHUNK_SIZE:
+        raise HTTPException(status_code=413, detail=f"Parte maior que o limite de {upload_service.MAX_CHUNK_SIZE} bytes.")
+    # Content-Length is only a hint; the body itself is capped while it streams in
+    return await upload_service.write_chunk_async(db, upload_id, offset, request.stream(), x_chunk_sha256)
+
+@app.post("/uploads/{upload_id}/finalizar", response_model=UploadParcialSchema)
+def finalize_upload(upload_id: str, db: Session = Depends(get_db)):
+    return upload_service.finalize_upload(db, upload_id)
+
+@app.delete("/uploads/{upload_id}")
+def abort_upload(upload_id: str, db: Session = Depends(get_db)):
+    upload_service.abort_upload(db, upload_id)
+    return {"message": "Upload cancelado"}
+
+# -- Job Endpoints --
+
+@app.get("/jobs/{job_id}", response_model=JobIngestaoSchema)
+def get_job(job_id: int, db: Session = Depends(get_db)):
+    job = db.query(JobIngestao).filter(JobIngestao.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/processos/{processo_id}/jobs", response_model=List[JobIngestaoSchema])
+def list_jobs_processo(processo_id: int, db: Session = Depends(get_db)):
+    return db.query(JobIngestao).filter(JobIngestao.processo_id == processo_id).order_by(JobIngestao.id.desc()).all()
 
 # -- Endpoints --
 
+def _data_version(db: Session, processo_id: int) -> Optional[int]:
+    return db.execute(read_service.data_version_query(processo_id)).scalar()
+
 @app.get("/processos", response_model=List[ProcessoSchema])
-def list_processos(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    processos = db.query(Processo).offset(skip).limit(limit).all()
-    return processos
+def list_processos(request: Request, response: Response, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    etag = read_service.processos_etag(skip, limit, db.execute(read_service.processos_version_query()).one())
+    if http_cache.is_fresh(request, etag):
+        return http_cache.not_modified(etag)
+
+    query = read_service.processos_query(skip, limit)
+    if fast_json.ENABLED:
+        return fast_json.FastJSONResponse(fast_json.rows(db, query), headers=http_cache.validator_headers(etag))
+    response.headers.update(http_cache.validator_headers(etag))
+    return db.execute(query).scalars().all()
 
 @app.get("/processos/{processo_id}", response_model=ProcessoSchema)
 def get_processo(processo_id: int, db: Session = Depends(get_db)):
@@ -181,134 +269,257 @@ def get_processo(processo_id: int, db: Session = Depends(get_db)):
 @app.get("/processos/{processo_id}/evidencias", response_model=List[EvidenciaUnificada])
 def list_evidencias_processo(
     processo_id: int,
+    request: Request,
+    response: Response,
     tipo: Optional[str] = None, # Filter by type
     pg_min: Optional[int] = None,
     pg_max: Optional[int] = None,
     q: Optional[str] = None, # Free text search
+    order: str = "pagina", # pagina | relevance (BM25, with q)
+    limit: Optional[int] = Query(None, ge=1, le=1000), # Page size (keyset pagination)
+    cursor: Optional[str] = None, # X-Next-Cursor of the previous page
+    fields: Optional[str] = None, # Projection, e.g. "tipo,resumo_conteudo,pagina_inicial"
     db: Session = Depends(get_db)
 ):
     """
-    Returns a unified list of evidences (both mapped and cataloged) for a process.
-    Supports filtering.
+    Returns a unified list of evidences (both mapped and cataloged) for a process,
+    ordered by page. Supports filtering; `q` is a full-text search (accent-insensitive,
+    prefix terms) and `order=relevance` sorts its matches by relevance instead.
+    With `limit`, returns one page and sends the cursor of the next one in the
+    X-Next-Cursor header (absent on the last page).
+    With `fields`, each item carries only those fields (plus id and source_type);
+    the full evidence is available from /evidencias/{source_type}/{id}.
+    Sends an ETag (process data_version + parameters) and answers If-None-Match with 304.
     """
-    
-    # 1. Query Mapeadas
-    query_map = db.query(EvidenciaMapeada).filter(EvidenciaMapeada.processo_id == processo_id)
-    if pg_min is not None:
-        query_map = query_map.filter(EvidenciaMapeada.pagina_final >= pg_min)
-    if pg_max is not None:
-        query_map = query_map.filter(EvidenciaMapeada.pagina_inicial <= pg_max)
-    if tipo:
-        query_map = query_map.filter(EvidenciaMapeada.tipo_evidencia.ilike(f"%{tipo}%"))
-    if q:
-        search = f"%{q}%"
-        query_map = query_map.filter(
-            or_(
-                EvidenciaMapeada.conteudo.ilike(search),
-                EvidenciaMapeada.resumo.ilike(search),
-                EvidenciaMapeada.trecho.ilike(search)
-            )
-        )
-    
-    # 2. Query Catalogadas
-    query_cat = db.query(EvidenciaCatalogada).filter(EvidenciaCatalogada.processo_id == processo_id)
-    if pg_min is not None:
-        query_cat = query_cat.filter(EvidenciaCatalogada.pagina_final >= pg_min)
-    if pg_max is not None:
-        query_cat = query_cat.filter(EvidenciaCatalogada.pagina_inicial <= pg_max)
-    # For cataloged, 'type' might map to 'origem_tipo'
-    if tipo:
-        query_cat = query_cat.filter(EvidenciaCatalogada.origem_tipo.ilike(f"%{tipo}%"))
-    if q:
-        search = f"%{q}%"
-        query_cat = query_cat.filter(
-            or_(
-                EvidenciaCatalogada.trecho.ilike(search),
-                EvidenciaCatalogada.chave_nfe.ilike(search),
-                EvidenciaCatalogada.numero_nf.ilike(search)
-            )
+    headers = {}
+    data_version = _data_version(db, processo_id)
+    if data_version is not None:
+        etag = read_service.evidencias_etag(processo_id, data_version, tipo, pg_min, pg_max, q, order, limit, cursor, fields)
+        if http_cache.is_fresh(request, etag):
+            return http_cache.not_modified(etag)
+        headers.update(http_cache.validator_headers(etag))
+
+    fields = read_service.listing_fields(fields)
+    try:
+        evidencias, next_cursor = evidencia_service.list_unificadas(
+            db, processo_id, tipo=tipo, pg_min=pg_min, pg_max=pg_max, q=q, cursor=cursor, limit=limit, order=order,
+            fields=fields
         )
-
-    results_map = query_map.all()
-    results_cat = query_cat.all()
-
-    unified_results = []
-
-    # Transform Mapeada
-    for item in results_map:
-        original_data = dict(item.dados_extras) if item.dados_extras else {}
-        original_data.update({ 
-            "referencia": item.referencia_original, 
-            "trecho": item.trecho 
-        })
-        
-        unified_results.append(EvidenciaUnificada(
-            id=item.id,
-            source_type="mapeada",
-            tipo=item.tipo_evidencia,
-            resumo_conteudo=item.resumo or item.conteudo[:200], # Fallback
-            pagina_inicial=item.pagina_inicial,
-            pagina_final=item.pagina_final,
-            original_data=original_data
-        ))
-
-    # Transform Catalogada
-    for item in results_cat:
-        original_data = dict(item.dados_extras) if item.dados_extras else {}
-        original_data.update({
-            "chave_nfe": item.chave_nfe,
-            "trecho": item.trecho
-        })
-
-        unified_results.append(EvidenciaUnificada(
-            id=item.id,
-            source_type="catalogada",
-            tipo=item.origem_tipo,
-            resumo_conteudo=f"NF: {item.numero_nf} - Valor: {item.valor_total}",
-            pagina_inicial=item.pagina_inicial,
-            pagina_final=item.pagina_final,
-            cnpj=item.cnpj_emitente,
-            data_emissao=item.data_emissao,
-            valor=item.valor_total,
-            original_data=original_data
-        ))
-    
-    # Sort by page number
-    unified_results.sort(key=lambda x: x.pagina_inicial or 0)
-    
-    return unified_results
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    if fields:
+        # Plain rows (partial items do not fit the response model): encoded directly
+        return fast_json.FastJSONResponse(evidencias, headers=headers)
+    response.headers.update(headers)
+    return evidencias
+
+@app.get("/evidencias/{source_type}/{evidencia_id}", response_model=EvidenciaUnificada)
+def get_evidencia(source_type: str, evidencia_id: int, db: Session = Depends(get_db)):
+    """Full evidence, including original_data (the spreadsheet row), loaded on demand."""
+    evidencia = evidencia_service.get_unificada(db, source_type, evidencia_id)
+    if not evidencia:
+        raise HTTPException(status_code=404, detail="Evidência não encontrada.")
+    return evidencia
 
 @app.get("/processos/{processo_id}/tipos_evidencia")
-def get_tipos_evidencia(processo_id: int, db: Session = Depends(get_db)):
-    # Distinct types
-    q_map = db.query(EvidenciaMapeada.tipo_evidencia).filter(EvidenciaMapeada.processo_id == processo_id).distinct()
-    q_cat = db.query(EvidenciaCatalogada.origem_tipo).filter(EvidenciaCatalogada.processo_id == processo_id).distinct()
-    
-    tipos = set()
-    for (t,) in q_map.all():
-        if t: types = [x.strip() for x in t.split('/') if x.strip()] # Split if multiple or just add
-        if t: tipos.add(t)
-            
-    for (t,) in q_cat.all():
-        if t: tipos.add(t)
-        
-    return list(sorted(tipos))
+def get_tipos_evidencia(processo_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
+    data_version = _data_version(db, processo_id)
+    if data_version is not None:
+        etag = http_cache.make_etag("tipos_evidencia", processo_id, data_version)
+        if http_cache.is_fresh(request, etag):
+            return http_cache.not_modified(etag)
+        response.headers.update(http_cache.validator_headers(etag))
+
+    # Precomputed at import (evidencias_facetas)
+    return evidencia_service.list_tipos(db, processo_id)
+
+@app.get("/processos/{processo_id}/facetas", response_model=FacetasSchema)
+def get_facetas(processo_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
+    """
+    Evidence counts per type (as imported and with compound types split on "/"),
+    and a page-range histogram. Computed at import; served without touching the evidence tables.
+    """
+    data_version = _data_version(db, processo_id)
+    if data_version is None:
+        raise HTTPException(status_code=404, detail="Process not found")
+    etag = http_cache.make_etag("facetas", processo_id, data_version)
+    if http_cache.is_fresh(request, etag):
+        return http_cache.not_modified(etag)
+    response.headers.update(http_cache.validator_headers(etag))
+    return evidencia_service.get_facetas(db, processo_id)
 
 # -- Text & Chat Endpoints --
 
 @app.get("/processos/{processo_id}/pagina_texto")
 def get_pagina_texto(processo_id: int, pagina: int, db: Session = Depends(get_db)):
-    processo = db.query(Processo).filter(Processo.id == processo_id).first()
-    if not processo or not processo.caminho_texto:
-        raise HTTPException(status_code=404, detail="Arquivo de texto não encontrado para este processo.")
-    
+    processo = db.execute(read_service.processo_query(processo_id)).scalar()
     # Resolve path
     # stored as uploads/X.txt, relative to backend/static
-    real_path = os.path.join(static_dir, processo.caminho_texto.replace("/", os.sep))
+    real_path = read_service.text_path(processo)
+    if not real_path:
+        raise HTTPException(status_code=404, detail="Arquivo de texto não encontrado para este processo.")
     
-    content = text_service.get_page_content(real_path, processo.marcador_pagina, pagina)
+    content = page_cache.get_page(processo_id, real_path, processo.marcador_pagina, pagina)
     return {"conteudo": content}
 
+@app.get("/processos/{processo_id}/paginas_texto")
+def get_paginas_texto(processo_id: int, paginas: List[int] = Query(...), db: Session = Depends(get_db)):
+    processo = db.execute(read_service.processo_query(processo_id)).scalar()
+    real_path = read_service.text_path(processo)
+    if not real_path:
+        raise HTTPException(status_code=404, detail="Arquivo de texto não encontrado para este processo.")
+
+    content = page_cache.get_pages(processo_id, real_path, processo.marcador_pagina, paginas)
+    return {"paginas": content}
+
+# -- PDF pages --
+
+def _processo_pdf(db: Session, processo_id: int):
+    """(processo, absolute PDF path); 404 if it has no PDF on disk."""
+    processo = db.execute(read_service.processo_query(processo_id)).scalar()
+    if not processo or not processo.caminho_pdf:
+        raise HTTPException(status_code=404, detail="PDF não encontrado para este processo.")
+    pdf_path = storage_service.real_path(processo.caminho_pdf)
+    if not os.path.exists(pdf_path):
+        raise HTTPException(status_code=404, detail="PDF não encontrado para este processo.")
+    return processo, pdf_path
+
+def _pdf_pages_response(request: Request, db: Session, processo_id: int, inicio: int, fim: int):
+    _, pdf_path = _processo_pdf(db, processo_id)
+    try:
+        pdf_service.validate_range(inicio, fim)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # The cache key already identifies the content (source file version + pages)
+    etag = http_cache.make_etag("paginas_pdf", pdf_service.pages_key(pdf_path, inicio, fim))
+    if http_cache.is_fresh(request, etag):
+        return http_cache.not_modified(etag)
+    try:
+        data = pdf_service.get_pages_pdf(pdf_path, inicio, fim)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return Response(content=data, media_type="application/pdf", headers=http_cache.validator_headers(etag))
+
+# Whole document for range-reading viewers. FileResponse answers Range (206, multipart
+# ranges, 416, If-Range) and HEAD; the ETag is the content sha256 of the stored file, and a
+# URL carrying that version (?v=) can be cached for good, since it always names the same bytes.
+PDF_IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+@app.get("/processos/{processo_id}/pdf")
+@app.head("/processos/{processo_id}/pdf")
+def get_processo_pdf(processo_id: int, request: Request, v: Optional[str] = None, db: Session = Depends(get_db)):
+    processo, pdf_path = _processo_pdf(db, processo_id)
+    versao = pdf_service.content_version(processo.caminho_pdf, pdf_path)
+    etag = f'"{versao}"'
+    headers = http_cache.validator_headers(etag)
+    headers["Accept-Ranges"] = "bytes"
+    if v == versao:
+        headers["Cache-Control"] = PDF_IMMUTABLE_CACHE_CONTROL
+    if http_cache.is_fresh(request, etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(pdf_path, media_type="application/pdf", headers=headers,
+                        content_disposition_type="inline", filename=f"processo_{processo_id}.pdf")
+
+# Declared before the single page route: "/paginas/3-5.pdf" must not reach it as pagina="3-5"
+@app.get("/processos/{processo_id}/paginas/{inicio}-{fim}.pdf")
+def get_paginas_pdf(processo_id: int, inicio: int, fim: int, request: Request, db: Session = Depends(get_db)):
+    """Pages inicio..fim (1-based, inclusive) of the process PDF as a standalone PDF, cached on disk."""
+    return _pdf_pages_response(request, db, processo_id, inicio, fim)
+
+@app.get("/processos/{processo_id}/paginas/{pagina}.pdf")
+def get_pagina_pdf(processo_id: int, pagina: int, request: Request, db: Session = Depends(get_db)):
+    """One page of the process PDF as a standalone PDF, cached on disk."""
+    return _pdf_pages_response(request, db, processo_id, pagina, pagina)
+
+async def _page_image_response(request: Request, db: Session, processo_id: int, pagina: int, tamanho: str,
+                               v: Optional[str]):
+    processo, pdf_path = await run_in_threadpool(_processo_pdf, db, processo_id)
+    versao = await run_in_threadpool(pdf_service.content_version, processo.caminho_pdf, pdf_path)
+    # Content-addressed like the PDF route: ?v=<sha256> URLs never change
+    etag = f'"{render_service.cache_key(versao, pagina, tamanho)[:-len(".png")]}"'
+    headers = http_cache.validator_headers(etag)
+    if v == versao:
+        headers["Cache-Control"] = PDF_IMMUTABLE_CACHE_CONTROL
+    if http_cache.is_fresh(request, etag):
+        return Response(status_code=304, headers=headers)
+    try:
+        data = await render_service.get_page_image(pdf_path, versao, pagina, tamanho)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return Response(content=data, media_type="image/png", headers=headers)
+
+@app.get("/processos/{processo_id}/paginas/{pagina}/thumb.png")
+async def get_pagina_thumb(processo_id: int, pagina: int, request: Request, v: Optional[str] = None,
+                           db: Session = Depends(get_db)):
+    """Page thumbnail (PNG, THUMB_WIDTH px wide). Pre-rendered at ingest; rendered on demand otherwise."""
+    return await _page_image_response(request, db, processo_id, pagina, "thumb", v)
+
+@app.get("/processos/{processo_id}/paginas/{pagina}/raster.png")
+async def get_pagina_raster(processo_id: int, pagina: int, request: Request, v: Optional[str] = None,
+                            db: Session = Depends(get_db)):
+    """Mid-resolution page image (PNG, RASTER_WIDTH px wide), rendered on demand."""
+    return await _page_image_response(request, db, processo_id, pagina, "raster", v)
+
+@app.get("/cache/paginas_png")
+def get_page_images_cache_stats():
+    return render_service.images_cache.stats()
+
+@app.get("/processos/{processo_id}/paginas/{pagina}/highlight")
+def get_pagina_highlight(processo_id: int, pagina: int, evidencia: Optional[str] = None, q: Optional[str] = None,
+                         db: Session = Depends(get_db)):
+    """
+    Rectangles to paint on a page (PDF points, top-left origin, plus the page size), from
+    the word-box index built at ingest: the text of an evidence (evidencia=source_type:id,
+    e.g. mapeada:12) or search terms (q).
+    """
+    texto = None
+    if evidencia:
+        source_type, _, evidencia_id = evidencia.partition(":")
+        if source_type not in evidencia_service.SOURCE_RANK or not evidencia_id.isdigit():
+            raise HTTPException(status_code=400, detail="Use evidencia=<mapeada|catalogada>:<id>.")
+        ev = evidencia_service.get_unificada(db, source_type, int(evidencia_id))
+        if not ev or ev.processo_id != processo_id:
+            raise HTTPException(status_code=404, detail="Evidência não encontrada.")
+        texto = evidencia_service.highlight_text(ev)
+    elif not q:
+        raise HTTPException(status_code=400, detail="Informe evidencia ou q.")
+
+    _, pdf_path = _processo_pdf(db, processo_id)
+    try:
+        return word_index_service.highlight(pdf_path, pagina, texto=texto, termos=q)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.get("/cache/paginas_pdf")
+def get_pdf_pages_cache_stats():
+    return pdf_service.pages_cache.stats()
+
+@app.get("/processos/{processo_id}/busca_texto")
+def busca_texto(processo_id: int, q: str, limit: int = Query(20, ge=1, le=200), db: Session = Depends(get_db)):
+    """
+    Full-text search over the page text of the process.
+    Returns page numbers ranked by relevance, each with a highlighted snippet.
+    """
+    processo = db.query(Processo).filter(Processo.id == processo_id).first()
+    real_path = read_service.text_path(processo)
+    if not real_path:
+        raise HTTPException(status_code=404, detail="Arquivo de texto não encontrado para este processo.")
+    if not processo.marcador_pagina:
+        raise HTTPException(status_code=400, detail="Marcador de página não definido para este processo.")
+
+    if not os.path.exists(real_path):
+        raise HTTPException(status_code=404, detail="Arquivo de texto não encontrado para este processo.")
+
+    return search_service.search_pages(db, real_path, processo.marcador_pagina, q, limit=limit)
+
+@app.get("/cache/paginas")
+def get_page_cache_stats():
+    return page_cache.stats()
+
 @app.post("/processos/{processo_id}/chat_sessions", response_model=ChatSessionSchema)
 def create_chat_session(
     processo_id: int, 
@@ -331,11 +542,10 @@ def create_chat_session(
     
     # Fetch texts
     paginas_texto = {}
-    if processo.caminho_texto:
-        real_path = os.path.join(static_dir, processo.caminho_texto.replace("/", os.sep))
-        for pg in pages_to_fetch:
-            if pg:
-                paginas_texto[pg] = text_service.get_page_content(real_path, processo.marcador_pagina, pg)
+    real_path = read_service.text_path(processo)
+    if real_path:
+        # One index lookup and one file handle for all pages
+        paginas_texto = page_cache.get_pages(processo_id, real_path, processo.marcador_pagina, [pg for pg in pages_to_fetch if pg])
     
     context_data = {
         "evidencias": evidencias,
@@ -352,8 +562,10 @@ def list_chat_sessions(processo_id: int, db: Session = Depends(get_db)):
 
 @app.get("/chat_sessions/{session_id}/messages", response_model=List[ChatMessageSchema])
 def get_chat_messages(session_id: int, db: Session = Depends(get_db)):
-    msgs = db.query(ChatMessage).filter(ChatMessage.session_id == session_id).order_by(ChatMessage.created_at).all()
-    return msgs
+    query = read_service.messages_query(session_id)
+    if fast_json.ENABLED:
+        return fast_json.FastJSONResponse(fast_json.rows(db, query))
+    return db.execute(query).scalars().all()
 
 @app.post("/chat_sessions/{session_id}/messages")
 def send_chat_message(session_id: int, payload: ChatMessageCreate, db: Session = Depends(get_db)):
@@ -363,6 +575,10 @@ def send_chat_message(session_id: int, payload: ChatMessageCreate, db: Session =
     response_text = chat_service.process_user_message(db, session_id, payload.content)
     return {"role": "assistant", "content": response_text}
 
+# DB_MODE=async: hot read endpoints served by async handlers (see async_api.py)
+if database.ASYNC_DB:
+    async_api.install(app)
+
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8003))
     uvicorn.run("backend.main:app", host="0.0.0.0", port=port, reload=True)
@@ -1,33 +1,108 @@
-from sqlalchemy import create_engine, text
-from database import engine
-
-def migrate():
-    with engine.connect() as conn:
-        print("Migrating Database...")
-        
-        # Check if columns exist in 'processos'
-        # SQLite doesn't have 'IF NOT EXISTS' for columns easily in one statement across versions,
-        # but we can try catch or check pragma.
-        # Simplest: Try ADD COLUMN, ignore error if duplicate.
-        
-        try:
-            conn.execute(text("ALTER TABLE processos ADD COLUMN caminho_texto VARCHAR"))
-            print("Added column 'caminho_texto'")
-        except Exception as e:
-            print(f"Skipped 'caminho_texto': {e}")
-
-        try:
-            conn.execute(text("ALTER TABLE processos ADD COLUMN marcador_pagina VARCHAR"))
-            print("Added column 'marcador_pagina'")
-        except Exception as e:
-            print(f"Skipped 'marcador_pagina': {e}")
-            
-        # Create new tables if they don't exist
-        # 'create_all' in main.py usually handles this, but we can rely on main startup.
-        # This script focuses on ALTER.
-        
-        conn.commit()
-        print("Migration compelete.")
+from datetime import datetime
+from loguru import logger
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+from .database import engine
+from .models import (EvidenciaMapeada, EvidenciaCatalogada, EvidenciaUnificadaMaterializada, EvidenciaFaceta,
+                     EvidenciaHistogramaPaginas)
+from . import search_service, evidencia_service
+
+# Versioned schema migrations. Each one runs once per database and is recorded in
+# schema_migrations; every step is also written to be harmless if re-applied, so a
+# database created by create_all (already up to date) just gets the versions recorded.
+# Run at API startup, or by hand: python -m backend.migrate_db
+
+
+def _add_column(conn, table: str, column: str, ddl_type: str):
+    columns = {c["name"] for c in inspect(conn).get_columns(table)}
+    if column not in columns:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+        logger.info(f"Coluna adicionada: {table}.{column}")
+
+
+def _create_indexes(conn, model, names):
+    for index in model.__table__.indexes:
+        if index.name in names:
+            index.create(conn, checkfirst=True)
+
+
+def _processo_texto(conn):
+    _add_column(conn, "processos", "caminho_texto", "VARCHAR")
+    _add_column(conn, "processos", "marcador_pagina", "VARCHAR")
+
+
+def _indices_evidencias(conn):
+    # The processo/tipo indexes this step used to create are dropped by step 7
+    _create_indexes(conn, EvidenciaMapeada, {"ix_evidencias_mapeadas_processo_pagina"})
+    _create_indexes(conn, EvidenciaCatalogada, {"ix_evidencias_catalogadas_processo_pagina"})
+
+
+def _busca_evidencias(conn):
+    search_service.create_evidence_index(conn)
+
+
+def _evidencias_unificadas(conn):
+    EvidenciaUnificadaMaterializada.__table__.create(conn, checkfirst=True)
+    evidencia_service.rebuild_all(Session(bind=conn))
+
+
+def _processo_data_version(conn):
+    _add_column(conn, "processos", "data_version", "INTEGER NOT NULL DEFAULT 1")
+
+
+def _facetas_evidencias(conn):
+    EvidenciaFaceta.__table__.create(conn, checkfirst=True)
+    EvidenciaHistogramaPaginas.__table__.create(conn, checkfirst=True)
+    evidencia_service.rebuild_all_facetas(Session(bind=conn))
+
+
+def _remove_indices_tipo_fontes(conn):
+    # Type filters and facets are served by evidencias_unificadas / evidencias_facetas;
+    # nothing reads the source tables by type anymore
+    for name in ("ix_evidencias_mapeadas_processo_tipo", "ix_evidencias_catalogadas_processo_tipo"):
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+# (version, description, step). Append only; never renumber.
+MIGRATIONS = [
+    (1, "processos: caminho_texto e marcador_pagina", _processo_texto),
+    (2, "evidências: índices compostos por processo/página e processo/tipo", _indices_evidencias),
+    (3, "evidências: índice FTS5 de texto livre com gatilhos de sincronização", _busca_evidencias),
+    (4, "evidências: tabela materializada evidencias_unificadas (backfill)", _evidencias_unificadas),
+    (5, "processos: data_version (ETags)", _processo_data_version),
+    (6, "evidências: facetas por tipo e histograma de páginas (backfill)", _facetas_evidencias),
+    (7, "evidências: remove os índices por tipo das tabelas de origem (sem uso)", _remove_indices_tipo_fontes),
+]
+
+
+def applied_versions(conn):
+    return {row[0] for row in conn.execute(text("SELECT versao FROM schema_migrations"))}
+
+
+def migrate(bind=engine):
+    """Applies pending migrations in order. Returns the versions applied in this run."""
+    with bind.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "versao INTEGER PRIMARY KEY, "
+            "descricao VARCHAR, "
+            "aplicada_em DATETIME)"
+        ))
+
+    applied = []
+    for versao, descricao, step in MIGRATIONS:
+        with bind.begin() as conn:
+            if versao in applied_versions(conn):
+                continue
+            step(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (versao, descricao, aplicada_em) VALUES (:v, :d, :t)"),
+                {"v": versao, "d": descricao, "t": datetime.utcnow()},
+            )
+        applied.append(versao)
+        logger.info(f"Migração {versao} aplicada: {descricao}")
+    return applied
+
 
 if __name__ == "__main__":
-    migrate()
+    print(f"Migrações aplicadas: {migrate() or 'nenhuma (banco atualizado)'}")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Date, Numeric, ForeignKey, DateTime, Boolean, JSON
+from sqlalchemy import Column, Integer, String, Text, Date, Numeric, ForeignKey, DateTime, Boolean, JSON, Float, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -23,11 +23,61 @@ class Processo(Base):
     caminho_texto = Column(String, nullable=True) # New: Path to full text file
     marcador_pagina = Column(String, nullable=True) # New: Marker used to split pages (e.g., [[PAGINA]])
     data_cadastro = Column(DateTime, default=datetime.utcnow)
+    # Bumped whenever the process data changes (imports, new PDF): the HTTP ETags are derived from it
+    data_version = Column(Integer, nullable=False, default=1, server_default="1")
 
     # Relationships
     evidencias_mapeadas = relationship("EvidenciaMapeada", back_populates="processo", cascade="all, delete-orphan")
     evidencias_catalogadas = relationship("EvidenciaCatalogada", back_populates="processo", cascade="all, delete-orphan")
     chat_sessions = relationship("ChatSession", back_populates="processo", cascade="all, delete-orphan")
+    jobs = relationship("JobIngestao", back_populates="processo", cascade="all, delete-orphan")
+    evidencias_unificadas = relationship("EvidenciaUnificadaMaterializada", back_populates="processo", cascade="all, delete-orphan")
+    facetas = relationship("EvidenciaFaceta", back_populates="processo", cascade="all, delete-orphan")
+    histograma_paginas = relationship("EvidenciaHistogramaPaginas", back_populates="processo", cascade="all, delete-orphan")
+
+class ArquivoArmazenado(Base):
+    """Content-addressed upload: one file on disk per distinct sha256, shared by reference count."""
+    __tablename__ = "arquivos_armazenados"
+
+    sha256 = Column(String, primary_key=True)
+    caminho = Column(String) # Relative to backend/static, e.g. uploads/cas/ab/ab12...pdf
+    tamanho = Column(Integer)
+    ref_count = Column(Integer, default=0)
+    criado_em = Column(DateTime, default=datetime.utcnow)
+
+class UploadParcial(Base):
+    """Resumable chunked upload: bytes land in a temp file until finalized into the content store."""
+    __tablename__ = "uploads_parciais"
+
+    id = Column(String, primary_key=True) # uuid4 hex
+    nome_arquivo = Column(String)
+    extensao = Column(String)
+    tamanho_total = Column(Integer)
+    recebido = Column(Integer, default=0) # Bytes received so far (next expected offset)
+    sha256_esperado = Column(String, nullable=True)
+    caminho_tmp = Column(String)
+    status = Column(String, default="aberto") # aberto | finalizado | consumido
+    sha256 = Column(String, nullable=True) # Set on finalize
+    caminho = Column(String, nullable=True) # Stored path, set on finalize
+    criado_em = Column(DateTime, default=datetime.utcnow)
+    atualizado_em = Column(DateTime, default=datetime.utcnow)
+
+class JobIngestao(Base):
+    __tablename__ = "jobs_ingestao"
+
+    id = Column(Integer, primary_key=True, index=True)
+    processo_id = Column(Integer, ForeignKey("processos.id"), index=True)
+    status = Column(String, default="queued") # queued | running | done | failed
+    etapa = Column(String, nullable=True) # Current step, shown while polling
+    parametros = Column(JSON, nullable=True) # Saved file paths, so queued jobs survive a restart
+    linhas_importadas = Column(Integer, default=0)
+    erro = Column(Text, nullable=True)
+    criado_em = Column(DateTime, default=datetime.utcnow)
+    iniciado_em = Column(DateTime, nullable=True)
+    finalizado_em = Column(DateTime, nullable=True)
+    duracao_segundos = Column(Float, nullable=True)
+
+    processo = relationship("Processo", back_populates="jobs")
 
 class ChatSession(Base):
     __tablename__ = "chat_sessions"
@@ -56,6 +106,11 @@ class ChatMessage(Base):
 
 class EvidenciaMapeada(Base):
     __tablename__ = "evidencias_mapeadas"
+    # One processo's rows, read to rebuild its evidencias_unificadas (the listing itself
+    # is served from there). Existing databases get this through migrate_db.
+    __table_args__ = (
+        Index("ix_evidencias_mapeadas_processo_pagina", "processo_id", "pagina_inicial", "pagina_final"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     processo_id = Column(Integer, ForeignKey("processos.id"))
@@ -74,6 +129,9 @@ class EvidenciaMapeada(Base):
 
 class EvidenciaCatalogada(Base):
     __tablename__ = "evidencias_catalogadas"
+    __table_args__ = (
+        Index("ix_evidencias_catalogadas_processo_pagina", "processo_id", "pagina_inicial", "pagina_final"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     processo_id = Column(Integer, ForeignKey("processos.id"))
@@ -98,3 +156,54 @@ class EvidenciaCatalogada(Base):
     dados_extras = Column(JSON, nullable=True)
 
     processo = relationship("Processo", back_populates="evidencias_catalogadas")
+
+class EvidenciaUnificadaMaterializada(Base):
+    """
+    Both evidence tables in the listing shape (schemas.EvidenciaUnificada), precomputed
+    by the ETL: rebuilt per processo and source whenever a spreadsheet is imported.
+    """
+    __tablename__ = "evidencias_unificadas"
+    # Listing order (page, mapeadas before catalogadas, id) is the index order
+    __table_args__ = (
+        Index("ix_evidencias_unificadas_processo_ordem", "processo_id", "ordem_pagina", "source_rank", "id"),
+        Index("ix_evidencias_unificadas_processo_tipo", "processo_id", "tipo"),
+    )
+
+    source_type = Column(String, primary_key=True) # "mapeada" or "catalogada"
+    id = Column(Integer, primary_key=True) # id in the source table
+    processo_id = Column(Integer, ForeignKey("processos.id"), nullable=False)
+    source_rank = Column(Integer, nullable=False) # 0 mapeada, 1 catalogada
+    ordem_pagina = Column(Integer, nullable=False) # pagina_inicial, 0 when missing
+
+    tipo = Column(String)
+    resumo_conteudo = Column(Text)
+    pagina_inicial = Column(Integer)
+    pagina_final = Column(Integer)
+    cnpj = Column(String)
+    data_emissao = Column(Date)
+    valor = Column(Numeric(precision=15, scale=2))
+    original_data = Column(JSON)
+
+    processo = relationship("Processo", back_populates="evidencias_unificadas")
+
+class EvidenciaFaceta(Base):
+    """Evidence counts per type of a process, computed at import (sidebar filters)."""
+    __tablename__ = "evidencias_facetas"
+
+    processo_id = Column(Integer, ForeignKey("processos.id"), primary_key=True)
+    faceta = Column(String, primary_key=True) # "tipo" (as imported) or "tipo_componente" (compound types split on "/")
+    valor = Column(String, primary_key=True)
+    quantidade = Column(Integer, nullable=False)
+
+    processo = relationship("Processo", back_populates="facetas")
+
+class EvidenciaHistogramaPaginas(Base):
+    """Evidence counts per page range of a process, computed at import."""
+    __tablename__ = "evidencias_histograma_paginas"
+
+    processo_id = Column(Integer, ForeignKey("processos.id"), primary_key=True)
+    pagina_inicial = Column(Integer, primary_key=True)
+    pagina_final = Column(Integer, nullable=False)
+    quantidade = Column(Integer, nullable=False)
+
+    processo = relationship("Processo", back_populates="histograma_paginas")
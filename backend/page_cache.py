@@ -0,0 +1,116 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+from . import text_service
+
+# Byte budget for cached page texts (default 64 MB)
+PAGE_CACHE_MAX_BYTES = int(os.getenv("PAGE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+
+class PageCache:
+    """
+    In-process LRU cache of page texts, bounded by memory size instead of entry count.
+    Entries are keyed on (processo_id, file size, file mtime, marker, page), so
+    re-uploading the text file of a process makes its old entries unreachable;
+    they are dropped as soon as the new version is seen.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (text, size)
+        self._versions = {}  # processo_id -> current file version
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _drop(self, key):
+        _, size = self._entries.pop(key)
+        self.current_bytes -= size
+
+    def _put(self, key, text: str):
+        size = sys.getsizeof(text)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (text, size)
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def _set_version(self, processo_id: int, version):
+        # Caller holds the lock. Purge entries of a previous file version right away.
+        if self._versions.get(processo_id) == version:
+            return
+        self._versions[processo_id] = version
+        stale = [k for k in self._entries if k[0] == processo_id and k[1] != version]
+        for k in stale:
+            self._drop(k)
+
+    def get_pages(self, processo_id: int, file_path: str, marker: str, page_nums) -> dict:
+        """Returns {page_num: content}, reading only the missing pages from text_service."""
+        page_nums = sorted(set(page_nums))
+        if not marker or not os.path.exists(file_path):
+            # Nothing worth caching: text_service returns the error message
+            return text_service.get_pages(file_path, marker, page_nums)
+
+        st = os.stat(file_path)
+        version = (st.st_size, st.st_mtime_ns, marker)
+
+        result = {}
+        missing = []
+        with self._lock:
+            self._set_version(processo_id, version)
+            for pg in page_nums:
+                key = (processo_id, version, pg)
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    result[pg] = entry[0]
+                    self.hits += 1
+                else:
+                    missing.append(pg)
+                    self.misses += 1
+
+        if missing:
+            # Only page texts are cached: an error (unreadable file, page out of range)
+            # is returned as its message but read again next time
+            loaded, errors = text_service.read_pages(file_path, marker, missing)
+            with self._lock:
+                for pg, text in loaded.items():
+                    self._put((processo_id, version, pg), text)
+            result.update(loaded)
+            result.update(errors)
+
+        return result
+
+    def get_page(self, processo_id: int, file_path: str, marker: str, page_num: int) -> str:
+        return self.get_pages(processo_id, file_path, marker, [page_num])[page_num]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entradas": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+page_cache = PageCache(PAGE_CACHE_MAX_BYTES)
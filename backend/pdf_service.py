@@ -0,0 +1,169 @@
+import hashlib
+import os
+import time
+
+import pymupdf
+from loguru import logger
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+
+from .models import Processo
+from .disk_cache import DiskCache, CACHE_ROOT
+from .text_service import PDF_PAGE_MARKER
+from . import storage_service, etl_service, extraction_service, process_pool
+
+try:
+    import pikepdf
+except ImportError:  # optional: without it PDFs are served as uploaded (not linearized)
+    pikepdf = None
+
+# Standalone PDFs of a few pages, cut from the process PDF on first request, so the
+# viewer downloads and parses kilobytes instead of the whole case file.
+PDF_PAGES_CACHE_MAX_BYTES = int(os.getenv("PDF_PAGES_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+MAX_RANGE_PAGES = int(os.getenv("PDF_MAX_RANGE_PAGES", 50))
+
+pages_cache = DiskCache(os.path.join(CACHE_ROOT, "paginas_pdf"), PDF_PAGES_CACHE_MAX_BYTES)
+
+
+def file_signature(file_path: str) -> str:
+    """Short digest of path, size and mtime: changes whenever the file is replaced."""
+    stat = os.stat(file_path)
+    raw = f"{os.path.abspath(file_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def page_count(file_path: str) -> int:
+    with pymupdf.open(file_path) as doc:
+        return doc.page_count
+
+
+def validate_range(inicio: int, fim: int):
+    """Raises ValueError for a malformed or too long page range (1-based, inclusive)."""
+    if inicio < 1 or fim < inicio:
+        raise ValueError("Intervalo de páginas inválido.")
+    if fim - inicio + 1 > MAX_RANGE_PAGES:
+        raise ValueError(f"Intervalo muito longo: no máximo {MAX_RANGE_PAGES} páginas.")
+
+
+def extract_pages(file_path: str, inicio: int, fim: int) -> bytes:
+    """
+    PDF holding pages inicio..fim (1-based, inclusive) of file_path. Only the objects
+    those pages use are copied (fonts, images), so the result is small even when the
+    source has hundreds of megabytes. Raises ValueError if a page does not exist.
+    """
+    with pymupdf.open(file_path) as src:
+        if fim > src.page_count:
+            raise ValueError(f"Página {fim} não existe (o PDF tem {src.page_count} páginas).")
+        with pymupdf.open() as out:
+            out.insert_pdf(src, from_page=inicio - 1, to_page=fim - 1)
+            return out.tobytes(garbage=3, deflate=True)
+
+
+def pages_key(file_path: str, inicio: int, fim: int) -> str:
+    return f"{file_signature(file_path)}-{inicio}-{fim}.pdf"
+
+
+def get_pages_pdf(file_path: str, inicio: int, fim: int) -> bytes:
+    """The cached standalone PDF of pages inicio..fim, extracting it on a miss."""
+    validate_range(inicio, fim)
+    return pages_cache.get_or_create(pages_key(file_path, inicio, fim),
+                                     lambda: extract_pages(file_path, inicio, fim))
+
+
+# -- Whole document delivery --
+
+def pdf_version(caminho: str):
+    """
+    Content hash of a stored PDF, taken from its content-addressed path
+    (uploads/cas/ab/<sha256>.pdf), or None for legacy paths.
+    """
+    if not caminho.startswith("uploads/cas/"):
+        return None
+    return os.path.splitext(os.path.basename(caminho))[0]
+
+
+def content_version(caminho: str, pdf_path: str) -> str:
+    """pdf_version, falling back to the file signature for legacy paths."""
+    return pdf_version(caminho) or file_signature(pdf_path)
+
+
+def linearize_processo_pdf(db: Session, processo_id: int) -> bool:
+    """
+    Replaces the process PDF by its linearized ("fast web view") version: first page
+    and page offsets at the start of the file, each page's objects together, so a
+    viewer using range requests fetches only the bytes of the pages it shows.
+    The result is stored by content like any upload and the process points to it.
+    Returns False when skipped (pikepdf missing, already linearized, PDF replaced meanwhile).
+    """
+    if pikepdf is None:
+        logger.info("pikepdf não instalado: PDF não linearizado")
+        return False
+    processo = db.get(Processo, processo_id)
+    anterior = processo.caminho_pdf
+    buffer, tmp_path = storage_service.new_temp_file()
+    buffer.close()
+    try:
+        with pikepdf.open(storage_service.real_path(anterior)) as pdf:
+            if pdf.is_linearized:
+                os.remove(tmp_path)
+                return False
+            # deterministic_id: the same upload always linearizes to the same bytes (deduplicated)
+            pdf.save(tmp_path, linearize=True, deterministic_id=True)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    arquivo = storage_service.publish_local_file(db, tmp_path, ".pdf")
+
+    # Conditional swap: a PDF uploaded while this ran wins
+    result = db.execute(
+        update(Processo)
+        .where(Processo.id == processo_id, Processo.caminho_pdf == anterior)
+        .values(caminho_pdf=arquivo.caminho)
+    )
+    if result.rowcount:
+        etl_service.bump_data_version(db, processo_id)
+    db.commit()
+    storage_service.release(db, anterior if result.rowcount else arquivo.caminho)
+    if result.rowcount:
+        logger.info(f"PDF linearizado: {anterior} -> {arquivo.caminho}")
+    return bool(result.rowcount)
+
+
+# -- Text extraction --
+
+def extract_processo_text(db: Session, processo_id: int):
+    """
+    Extracts the text of the process PDF (extraction_service, on the process pool) and
+    makes it the process text, split by PDF_PAGE_MARKER so text pages match PDF pages.
+    Returns the path of the text file, or None when skipped: a text file uploaded by the
+    user always wins over the extracted one, and a PDF replaced meanwhile makes it stale.
+    """
+    processo = db.get(Processo, processo_id)
+    anterior = processo.caminho_texto
+    pdf = processo.caminho_pdf
+    start = time.perf_counter()
+    buffer, tmp_path = storage_service.new_temp_file()
+    try:
+        with buffer:
+            paginas = extraction_service.extract_text(storage_service.real_path(pdf), buffer)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    elapsed = time.perf_counter() - start
+    arquivo = storage_service.publish_local_file(db, tmp_path, ".txt")
+
+    # Conditional swap: only a missing or previously extracted text is replaced, and only
+    # while the process still has the PDF it came from (a newer upload gets its own job)
+    result = db.execute(
+        update(Processo)
+        .where(Processo.id == processo_id, Processo.caminho_pdf == pdf,
+               or_(Processo.caminho_texto.is_(None), Processo.marcador_pagina == PDF_PAGE_MARKER))
+        .values(caminho_texto=arquivo.caminho, marcador_pagina=PDF_PAGE_MARKER)
+    )
+    if result.rowcount:
+        etl_service.bump_data_version(db, processo_id)
+    db.commit()
+    storage_service.release(db, anterior if result.rowcount else arquivo.caminho)
+    logger.info(f"Texto extraído do PDF do processo {processo_id}: {paginas} páginas em {elapsed:.1f}s "
+                f"({paginas / max(elapsed, 1e-6):.0f} páginas/s, {process_pool.PROCESS_WORKERS} processos)")
+    return storage_service.real_path(arquivo.caminho) if result.rowcount else None
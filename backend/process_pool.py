@@ -0,0 +1,41 @@
+import importlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# One process pool for the CPU-bound PDF work (page rendering, text extraction), so
+# the server never runs more than PROCESS_WORKERS worker processes however many of
+# those tasks overlap. Started on first use, shut down with the app (see main.lifespan).
+PROCESS_WORKERS = int(os.getenv("PROCESS_WORKERS", os.cpu_count() or 2))
+# What the tasks run: PyMuPDF and the page/text helpers, no database or web app
+WORKER_MODULES = ("backend.render_service", "backend.extraction_service")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _init_worker():
+    # Loaded once per worker, before its first task. (spawn also re-imports the parent's
+    # main module; backend.main keeps its startup work in the app lifespan for that reason)
+    for name in WORKER_MODULES:
+        importlib.import_module(name)
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a process that runs server threads is unsafe
+            _pool = ProcessPoolExecutor(max_workers=PROCESS_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+                                        initializer=_init_worker)
+        return _pool
+
+
+def shutdown():
+    """Stops the workers (tasks not started yet are cancelled). A later get_pool() starts a new pool."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
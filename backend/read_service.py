@@ -0,0 +1,63 @@
+import os
+from sqlalchemy import select, func
+from .models import Processo, ChatMessage
+from .schemas import ProcessoSchema, ChatMessageSchema
+from . import fast_json, http_cache, storage_service, evidencia_service
+
+# Read paths shared by the sync endpoints (main.py) and their async versions (async_api.py):
+# Core select builders and the ETags derived from them. Each mode only differs in how
+# it executes the statements (Session vs AsyncSession).
+
+
+def processo_query(processo_id: int):
+    return select(Processo).where(Processo.id == processo_id)
+
+
+def data_version_query(processo_id: int):
+    return select(Processo.data_version).where(Processo.id == processo_id)
+
+
+def processos_version_query():
+    # Any insert, delete or data_version bump changes one of these aggregates
+    return select(func.count(Processo.id), func.max(Processo.id), func.sum(Processo.data_version))
+
+
+def processos_query(skip: int, limit: int):
+    """Process list page: plain rows in fast JSON mode, ORM objects otherwise."""
+    if fast_json.ENABLED:
+        return fast_json.schema_select(Processo, ProcessoSchema).offset(skip).limit(limit)
+    return select(Processo).offset(skip).limit(limit)
+
+
+def messages_query(session_id: int):
+    if fast_json.ENABLED:
+        query = fast_json.schema_select(ChatMessage, ChatMessageSchema)
+    else:
+        query = select(ChatMessage)
+    return query.where(ChatMessage.session_id == session_id).order_by(ChatMessage.created_at)
+
+
+def processos_etag(skip: int, limit: int, versions) -> str:
+    total, max_id, version_sum = versions
+    return http_cache.make_etag("processos", skip, limit, total, max_id, version_sum, fast_json.ENABLED)
+
+
+def evidencias_etag(processo_id: int, data_version: int, tipo, pg_min, pg_max, q, order, limit, cursor, fields) -> str:
+    return http_cache.make_etag(
+        "evidencias", processo_id, data_version, tipo, pg_min, pg_max, q, order, limit, cursor, fields,
+        fast_json.ENABLED
+    )
+
+
+def listing_fields(fields):
+    """In fast JSON mode the full evidence shape is also served as plain rows."""
+    if not fields and fast_json.ENABLED:
+        return ",".join(evidencia_service.PROJECTABLE_FIELDS)
+    return fields
+
+
+def text_path(processo: Processo):
+    """Absolute path of the process text file, or None if it has none."""
+    if not processo or not processo.caminho_texto:
+        return None
+    return os.path.join(storage_service.STATIC_DIR, processo.caminho_texto.replace("/", os.sep))
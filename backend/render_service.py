@@ -0,0 +1,74 @@
+import asyncio
+import os
+from concurrent.futures import as_completed
+
+import pymupdf
+from loguru import logger
+
+from .disk_cache import DiskCache, CACHE_ROOT
+from .process_pool import get_pool
+
+# Page images (PNG) rendered with PyMuPDF on the shared process pool, so rasterizing uses every
+# core and never competes with the API threads for the GIL. Entries are keyed by the
+# content version of the PDF (its sha256), page and width: a replaced PDF gets new keys.
+# This module only imports what the workers need (they are spawned, not forked).
+SIZES = {
+    "thumb": int(os.getenv("THUMB_WIDTH", 200)),    # evidence list previews
+    "raster": int(os.getenv("RASTER_WIDTH", 1000)),  # mid resolution page image
+}
+RENDER_BATCH_PAGES = 32  # pages per pool task when pre-rendering (one PDF open each)
+PAGE_IMAGES_CACHE_MAX_BYTES = int(os.getenv("PAGE_IMAGES_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+
+images_cache = DiskCache(os.path.join(CACHE_ROOT, "paginas_png"), PAGE_IMAGES_CACHE_MAX_BYTES)
+
+def render_pages(pdf_path: str, paginas, largura: int):
+    """Worker: [(pagina, png bytes)] for the pages that exist, each scaled to `largura` pixels."""
+    rendered = []
+    with pymupdf.open(pdf_path) as doc:
+        for pagina in paginas:
+            if not 1 <= pagina <= doc.page_count:
+                continue
+            page = doc[pagina - 1]
+            zoom = largura / page.rect.width
+            pix = page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), alpha=False)
+            rendered.append((pagina, pix.tobytes("png")))
+    return rendered
+
+
+def cache_key(versao: str, pagina: int, tamanho: str) -> str:
+    return f"{versao}-{pagina}-{SIZES[tamanho]}.png"
+
+
+async def get_page_image(pdf_path: str, versao: str, pagina: int, tamanho: str) -> bytes:
+    """The cached PNG of a page, rendered on the pool on a miss. ValueError if the page does not exist."""
+    key = cache_key(versao, pagina, tamanho)
+    data = await asyncio.to_thread(images_cache.get, key)
+    if data is not None:
+        return data
+    loop = asyncio.get_running_loop()
+    rendered = await loop.run_in_executor(get_pool(), render_pages, pdf_path, [pagina], SIZES[tamanho])
+    if not rendered:
+        raise ValueError(f"Página {pagina} não existe.")
+    data = rendered[0][1]
+    await asyncio.to_thread(images_cache.put, key, data)
+    return data
+
+
+def prerender(pdf_path: str, versao: str, tamanho: str = "thumb") -> int:
+    """
+    Renders every page not cached yet, in batches spread over the pool (blocking; used by
+    the ingestion job). Returns the number of pages rendered.
+    """
+    with pymupdf.open(pdf_path) as doc:
+        total = doc.page_count
+    missing = [n for n in range(1, total + 1) if not os.path.exists(images_cache.path(cache_key(versao, n, tamanho)))]
+    batches = [missing[i:i + RENDER_BATCH_PAGES] for i in range(0, len(missing), RENDER_BATCH_PAGES)]
+    pool = get_pool()
+    futures = [pool.submit(render_pages, pdf_path, batch, SIZES[tamanho]) for batch in batches]
+    rendered = 0
+    for future in as_completed(futures):
+        for pagina, data in future.result():
+            images_cache.put(cache_key(versao, pagina, tamanho), data)
+            rendered += 1
+    logger.info(f"Imagens de página ({tamanho}) geradas: {rendered} de {total} páginas")
+    return rendered
@@ -53,6 +53,26 @@ class EvidenciaUnificada(BaseModel):
 
     original_data: dict # Full payload
 
+    class Config:
+        from_attributes = True
+
+
+class FacetaValor(BaseModel):
+    valor: str
+    quantidade: int
+
+class FaixaPaginas(BaseModel):
+    pagina_inicial: int
+    pagina_final: int
+    quantidade: int
+
+class FacetasSchema(BaseModel):
+    total: int
+    sem_pagina: int # evidences without a page (not in the histogram)
+    tipos: List[FacetaValor]
+    tipos_componentes: List[FacetaValor] # compound types ("A / B") split into A and B
+    paginas: List[FaixaPaginas]
+
 
 # -- Chat Schemas --
 
@@ -109,6 +129,38 @@ class ProcessoSchema(ProcessoBase):
     class Config:
         from_attributes = True
 
+class UploadInit(BaseModel):
+    nome_arquivo: str
+    tamanho_total: int
+    sha256: Optional[str] = None # Whole-file checksum, verified on finalize
+
+class UploadParcialSchema(BaseModel):
+    id: str
+    nome_arquivo: str
+    tamanho_total: int
+    recebido: int
+    status: str
+    sha256: Optional[str] = None
+    caminho: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class JobIngestaoSchema(BaseModel):
+    id: int
+    processo_id: int
+    status: str
+    etapa: Optional[str] = None
+    linhas_importadas: int = 0
+    erro: Optional[str] = None
+    criado_em: datetime
+    iniciado_em: Optional[datetime] = None
+    finalizado_em: Optional[datetime] = None
+    duracao_segundos: Optional[float] = None
+
+    class Config:
+        from_attributes = True
+
 class Token(BaseModel):
     access_token: str
     token_type: str
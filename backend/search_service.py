@@ -0,0 +1,238 @@
+import re
+import threading
+import unicodedata
+from sqlalchemy import text, table, column, func
+from sqlalchemy.orm import Session
+from loguru import logger
+from . import text_service
+from .database import IS_SQLITE
+
+# Page text lives in an FTS5 table keyed by "documento" (text sha256 + marker digest),
+# so processes sharing the same text file share the same index.
+# remove_diacritics: "certidao" finds "certidão" (content is Portuguese).
+FTS_TOKENIZER = "unicode61 remove_diacritics 2"
+INSERT_BATCH_SIZE = 500
+# FTS5 is SQLite-only: on a server database (DATABASE_URL) the indexes are not created,
+# evidence text queries fall back to ILIKE and page search to a scan of the text file.
+FTS_AVAILABLE = IS_SQLITE
+
+_index_lock = threading.Lock()
+
+
+def ensure_schema(engine):
+    """Creates the FTS5 tables used for page text search (idempotent)."""
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS paginas_fts USING fts5("
+            "conteudo, documento, pagina UNINDEXED, "
+            f"tokenize = '{FTS_TOKENIZER}')"
+        ))
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS paginas_fts_documentos ("
+            "documento VARCHAR PRIMARY KEY, "
+            "total_paginas INTEGER, "
+            "indexado_em DATETIME DEFAULT CURRENT_TIMESTAMP)"
+        ))
+
+
+# Evidence text: one external-content FTS5 table per evidence table (no copy of the
+# text, rowid = evidence id), kept in sync by triggers on insert/update/delete.
+EVIDENCE_FTS_COLUMNS = {
+    "evidencias_mapeadas": ["conteudo", "resumo", "trecho"],
+    "evidencias_catalogadas": ["trecho", "chave_nfe", "numero_nf"],
+}
+
+
+def evidence_fts_name(source_table: str) -> str:
+    return f"{source_table}_fts"
+
+
+# Lightweight table constructs of the evidence FTS tables, for use in select().
+# One instance per table, so a query referring to it several times has a single FROM.
+_evidence_fts_tables = {
+    source: table(evidence_fts_name(source), column("rowid"), column(evidence_fts_name(source)))
+    for source in EVIDENCE_FTS_COLUMNS
+}
+
+
+def evidence_fts_table(source_table: str):
+    return _evidence_fts_tables[source_table]
+
+
+def evidence_fts_match(source_table: str, match: str):
+    fts = evidence_fts_table(source_table)
+    return fts.c[evidence_fts_name(source_table)].match(match)
+
+
+def evidence_fts_rank(source_table: str):
+    # bm25() is "lower is better"
+    fts = evidence_fts_table(source_table)
+    return func.bm25(fts.c[evidence_fts_name(source_table)])
+
+
+def create_evidence_index(conn):
+    """Creates the evidence FTS tables and sync triggers, and indexes existing rows (idempotent)."""
+    if conn.dialect.name != "sqlite":
+        return
+    for source, columns in EVIDENCE_FTS_COLUMNS.items():
+        fts = evidence_fts_name(source)
+        cols = ", ".join(columns)
+        new_values = ", ".join(f"new.{c}" for c in columns)
+        old_values = ", ".join(f"old.{c}" for c in columns)
+        delete_old = (f"INSERT INTO {fts} ({fts}, rowid, {cols}) "
+                      f"VALUES ('delete', old.id, {old_values});")
+        insert_new = f"INSERT INTO {fts} (rowid, {cols}) VALUES (new.id, {new_values});"
+
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+            f"{cols}, content='{source}', content_rowid='id', "
+            f"tokenize = '{FTS_TOKENIZER}')"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {source} BEGIN {insert_new} END"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {source} BEGIN {delete_old} END"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {source} BEGIN {delete_old} {insert_new} END"
+        ))
+        conn.execute(text(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')"))
+
+
+def build_match_query(q: str, prefix: bool = False) -> str:
+    """
+    Turns free user input into a safe FTS5 expression: every term is quoted
+    (so punctuation like "fls. 10/12" or a stray quote is not FTS syntax) and
+    terms are combined with AND. With prefix=True every term also matches as a
+    prefix ("cert" finds "certidão"), for search-as-you-type boxes.
+    """
+    suffix = "*" if prefix else ""
+    return " ".join(f'"{t}"{suffix}' for t in search_terms(q))
+
+
+def search_terms(q: str):
+    """Terms of free user input (whitespace-separated, quotes dropped)."""
+    terms = [t.replace('"', '') for t in re.split(r"\s+", q.strip())]
+    return [t for t in terms if t]
+
+
+def _fold(value: str) -> str:
+    """Lowercase without diacritics, like the FTS tokenizer ("Certidão" -> "certidao")."""
+    decomposed = unicodedata.normalize("NFKD", value.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def _documento_filter(documento: str) -> str:
+    return f'documento : "{documento}"'
+
+
+def is_indexed(db: Session, documento: str) -> bool:
+    row = db.execute(
+        text("SELECT 1 FROM paginas_fts_documentos WHERE documento = :d"), {"d": documento}
+    ).first()
+    return row is not None
+
+
+def index_text(db: Session, file_path: str, marker: str) -> str:
+    """
+    Splits the text file by marker and loads its pages into paginas_fts.
+    Skips the work if the same content/marker was already indexed. Returns the documento key.
+    """
+    documento = text_service.document_key(text_service.load_page_index(file_path, marker))
+    if not FTS_AVAILABLE:
+        return documento
+
+    with _index_lock:
+        if is_indexed(db, documento):
+            return documento
+
+        # Clear leftovers of an interrupted run before loading
+        db.execute(
+            text("DELETE FROM paginas_fts WHERE rowid IN "
+                 "(SELECT rowid FROM paginas_fts WHERE paginas_fts MATCH :m)"),
+            {"m": _documento_filter(documento)},
+        )
+
+        batch = []
+        total = 0
+        for page_num, content in text_service.iter_pages(file_path, marker):
+            batch.append({"c": content, "d": documento, "p": page_num})
+            if len(batch) >= INSERT_BATCH_SIZE:
+                db.execute(text("INSERT INTO paginas_fts (conteudo, documento, pagina) VALUES (:c, :d, :p)"), batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            db.execute(text("INSERT INTO paginas_fts (conteudo, documento, pagina) VALUES (:c, :d, :p)"), batch)
+            total += len(batch)
+
+        db.execute(
+            text("INSERT INTO paginas_fts_documentos (documento, total_paginas) VALUES (:d, :t)"),
+            {"d": documento, "t": total},
+        )
+        db.commit()
+
+    logger.info(f"Texto indexado para busca: {total} páginas (documento {documento[:12]}...)")
+    return documento
+
+
+def remove_content(db: Session, sha256: str):
+    """Drops the search index of a text file (every marker it was indexed with)."""
+    if not FTS_AVAILABLE:
+        return
+    with _index_lock:
+        db.execute(
+            text("DELETE FROM paginas_fts WHERE rowid IN "
+                 "(SELECT rowid FROM paginas_fts WHERE paginas_fts MATCH :m)"),
+            {"m": f'documento : "{sha256}"'},
+        )
+        db.execute(
+            text("DELETE FROM paginas_fts_documentos WHERE documento LIKE :prefix"),
+            {"prefix": f"{sha256}-%"},
+        )
+        db.commit()
+
+
+def search_pages(db: Session, file_path: str, marker: str, q: str, limit: int = 20):
+    """
+    Full-text search over the pages of a text file. Returns the best pages first
+    (BM25), each with a highlighted snippet. Indexes the file on first use.
+    """
+    match = build_match_query(q)
+    if not match:
+        return []
+    if not FTS_AVAILABLE:
+        return _scan_pages(file_path, marker, search_terms(q), limit)
+
+    documento = index_text(db, file_path, marker)
+
+    rows = db.execute(
+        text(
+            "SELECT pagina, "
+            "snippet(paginas_fts, 0, '**', '**', '…', 16) AS trecho, "
+            "bm25(paginas_fts, 1.0, 0.0) AS score "
+            "FROM paginas_fts WHERE paginas_fts MATCH :m "
+            "ORDER BY score LIMIT :limit"
+        ),
+        {"m": f"{_documento_filter(documento)} AND conteudo : ({match})", "limit": limit},
+    ).all()
+
+    # bm25() is "lower is better"; expose a positive relevance instead
+    return [{"pagina": r.pagina, "trecho": r.trecho, "score": round(-r.score, 4)} for r in rows]
+
+
+def _scan_pages(file_path: str, marker: str, terms, limit: int):
+    """search_pages without FTS5: pages holding every term, ranked by term occurrences."""
+    terms = [_fold(t) for t in terms]
+    results = []
+    for page_num, content in text_service.iter_pages(file_path, marker):
+        folded = _fold(content)
+        counts = [folded.count(t) for t in terms]
+        if all(counts):
+            start = max(folded.find(terms[0]) - 60, 0)
+            trecho = content[start:start + 160].replace("\n", " ")
+            results.append({"pagina": page_num, "trecho": f"…{trecho}…", "score": float(sum(counts))})
+    results.sort(key=lambda r: -r["score"])
+    return results[:limit]
@@ -0,0 +1,207 @@
+import hashlib
+import os
+import tempfile
+import anyio
+from fastapi import UploadFile
+from loguru import logger
+from sqlalchemy import select, update, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from .models import ArquivoArmazenado
+from . import search_service
+
+# Uploads are stored by content: static/uploads/cas/<2 first hex chars>/<sha256><ext>.
+# Identical uploads share one file (and every artifact derived from it, such as page
+# and search indexes); ref_count tracks how many records point to it.
+STATIC_DIR = os.path.join(os.path.dirname(__file__), "static")
+UPLOADS_DIR = os.path.join(STATIC_DIR, "uploads")
+CAS_DIR = os.path.join(UPLOADS_DIR, "cas")
+TMP_DIR = os.path.join(UPLOADS_DIR, "tmp")
+CHUNK_SIZE = 1024 * 1024
+
+# Upload file I/O (and its short DB commits) runs on its own small thread limiter,
+# so concurrent big uploads never occupy the threadpool that serves sync endpoints.
+UPLOAD_IO_THREADS = int(os.getenv("UPLOAD_IO_THREADS", 4))
+_io_limiter = None
+
+
+async def run_io(func, *args):
+    """Runs a blocking call on the upload I/O threads."""
+    global _io_limiter
+    if _io_limiter is None:
+        _io_limiter = anyio.CapacityLimiter(UPLOAD_IO_THREADS)
+    return await anyio.to_thread.run_sync(func, *args, limiter=_io_limiter)
+
+
+def real_path(caminho: str) -> str:
+    """Absolute path of a stored file given its relative 'uploads/...' path."""
+    return os.path.join(STATIC_DIR, caminho.replace("/", os.sep))
+
+
+def stored_path(path: str) -> str:
+    """Relative 'uploads/...' path of a stored file given its absolute path (inverse of real_path)."""
+    return os.path.relpath(path, STATIC_DIR).replace(os.sep, "/")
+
+
+def cas_relative_path(sha256: str, extensao: str) -> str:
+    return f"uploads/cas/{sha256[:2]}/{sha256}{extensao}"
+
+
+def new_temp_file():
+    """Opens a temp file on the same filesystem as the store, so publishing it is a rename."""
+    os.makedirs(TMP_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=TMP_DIR, suffix=".part")
+    return os.fdopen(fd, "wb"), tmp_path
+
+
+def _add_reference(db: Session, sha256: str, caminho: str, tamanho: int) -> ArquivoArmazenado:
+    """
+    Takes one reference to the content with an atomic increment, inserting its row on
+    first sight. Does not commit: the row stays locked until the caller's commit.
+    """
+    a = ArquivoArmazenado
+    while True:
+        result = db.execute(
+            update(a).where(a.sha256 == sha256).values(ref_count=a.ref_count + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            break
+        try:
+            with db.begin_nested():
+                db.add(ArquivoArmazenado(sha256=sha256, caminho=caminho, tamanho=tamanho, ref_count=1))
+            break
+        except IntegrityError:
+            # Same content registered concurrently by another request: count on its row
+            continue
+    return db.execute(
+        select(a).where(a.sha256 == sha256).execution_options(populate_existing=True)
+    ).scalar_one()
+
+
+def publish_temp_file(db: Session, tmp_path: str, sha256: str, tamanho: int, extensao: str) -> ArquivoArmazenado:
+    """
+    Moves a fully written temp file into the store under its hash and takes a reference.
+    If the content is already stored the temp file is discarded (no extra disk).
+    The reference is taken first and the file placed before committing it, so a
+    concurrent release of the same content (which deletes under the same row lock)
+    can never remove the blob this reference points to.
+    """
+    try:
+        arquivo = _add_reference(db, sha256, cas_relative_path(sha256, extensao), tamanho)
+        destino = real_path(arquivo.caminho)
+        if os.path.exists(destino):
+            os.remove(tmp_path)
+            logger.info(f"Upload deduplicado: {sha256[:12]}... já armazenado")
+        else:
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            os.replace(tmp_path, destino)
+        db.commit()
+    except Exception:
+        db.rollback()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return arquivo
+
+
+def save_upload(db: Session, fileobj, extensao: str) -> ArquivoArmazenado:
+    """
+    Streams an uploaded file to disk while computing its sha256 and size, then stores
+    it by content. Returns the stored file record (with one more reference).
+    """
+    hasher = hashlib.sha256()
+    tamanho = 0
+    buffer, tmp_path = new_temp_file()
+    try:
+        with buffer:
+            while True:
+                chunk = fileobj.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                buffer.write(chunk)
+                tamanho += len(chunk)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    return publish_temp_file(db, tmp_path, hasher.hexdigest(), tamanho, extensao)
+
+
+def publish_local_file(db: Session, tmp_path: str, extensao: str) -> ArquivoArmazenado:
+    """Stores a file the server generated itself (in TMP_DIR, see new_temp_file) by content."""
+    hasher = hashlib.sha256()
+    tamanho = 0
+    with open(tmp_path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            hasher.update(chunk)
+            tamanho += len(chunk)
+    return publish_temp_file(db, tmp_path, hasher.hexdigest(), tamanho, extensao)
+
+
+def _hash_and_write(hasher, buffer, chunk: bytes):
+    # hashlib releases the GIL on large buffers, so both run fine off the event loop
+    hasher.update(chunk)
+    buffer.write(chunk)
+
+
+async def save_upload_async(db: Session, upload: UploadFile, extensao: str) -> ArquivoArmazenado:
+    """
+    Async save_upload for request handlers: reads the UploadFile in chunks and hashes/writes
+    each one on the upload I/O threads, so the event loop and the default threadpool stay free.
+    """
+    hasher = hashlib.sha256()
+    tamanho = 0
+    buffer, tmp_path = await run_io(new_temp_file)
+    try:
+        with buffer:
+            while True:
+                chunk = await upload.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                await run_io(_hash_and_write, hasher, buffer, chunk)
+                tamanho += len(chunk)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    return await run_io(publish_temp_file, db, tmp_path, hasher.hexdigest(), tamanho, extensao)
+
+
+def release(db: Session, caminho: str):
+    """
+    Drops one reference to a stored file. When nobody references it anymore the file
+    and its derived artifacts (page index sidecars, search index) are deleted.
+    Paths outside the content store (legacy uploads) are ignored.
+    """
+    if not caminho or not caminho.startswith("uploads/cas/"):
+        return
+    a = ArquivoArmazenado
+    result = db.execute(
+        update(a).where(a.caminho == caminho).values(ref_count=a.ref_count - 1)
+        .execution_options(synchronize_session=False)
+    )
+    if not result.rowcount:
+        db.commit()
+        return
+    sha256 = db.execute(select(a.sha256).where(a.caminho == caminho)).scalar()
+    # Only the decrement that reaches 0 deletes; the row stays locked while the files go,
+    # so a concurrent upload of the same content waits and then stores it again
+    deleted = db.execute(
+        delete(a).where(a.caminho == caminho, a.ref_count <= 0).execution_options(synchronize_session=False)
+    )
+    if not deleted.rowcount:
+        db.commit()
+        return
+    try:
+        path = real_path(caminho)
+        folder, name = os.path.split(path)
+        for entry in os.listdir(folder) if os.path.isdir(folder) else []:
+            if entry == name or entry.startswith(name + "."):
+                os.remove(os.path.join(folder, entry))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    if caminho.endswith(".txt"):
+        search_service.remove_content(db, sha256)
+    logger.info(f"Arquivo sem referências removido: {caminho}")
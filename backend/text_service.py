@@ -1,38 +1,192 @@
+import hashlib
+import json
+import mmap
 import os
+import tempfile
+import threading
 
-def get_page_content(file_path: str, marker: str, page_num: int) -> str:
+# Page index sidecar: "<arquivo>.<digest do marcador>.idx.json" next to the text file.
+# It stores the byte offsets [start, end) of every non-blank page, plus the file's
+# sha256/size/mtime so a re-upload (or a different marker) invalidates it.
+INDEX_SUFFIX = ".idx.json"
+INDEX_VERSION = 2
+
+# Separator of the text extracted from the PDF itself (see extraction_service): one block
+# per PDF page, in order. Unlike user markers, blank blocks are kept as (empty) pages,
+# so page N of the text is always page N of the PDF.
+PDF_PAGE_MARKER = "\f"
+
+_index_cache = {}  # (file_path, marker) -> index dict
+_index_lock = threading.Lock()
+
+
+def _index_path(file_path: str, marker: str) -> str:
+    marker_digest = hashlib.md5(marker.encode("utf-8")).hexdigest()[:8]
+    return f"{file_path}.{marker_digest}{INDEX_SUFFIX}"
+
+
+def _file_signature(file_path: str):
+    st = os.stat(file_path)
+    return st.st_size, st.st_mtime_ns
+
+
+def _is_valid(index: dict, marker: str, signature) -> bool:
+    return (
+        index.get("version") == INDEX_VERSION
+        and index.get("marker") == marker
+        and (index.get("size"), index.get("mtime_ns")) == signature
+    )
+
+
+def build_page_index(file_path: str, marker: str) -> dict:
     """
-    Parses the text file using the provided marker and returns the content of the specific page.
-    Page numbers are assumed to be 1-based logic (User says "Page 1", we look for 1st block).
-    
-    If no marker is provided or file doesn't exist, returns None or specific error string.
+    Scans the text file once and records the byte offsets of every non-blank page.
+    The index is persisted next to the file and kept in memory for later lookups.
     """
+    size, mtime_ns = _file_signature(file_path)
+    marker_bytes = marker.encode("utf-8")
+    keep_blank = marker == PDF_PAGE_MARKER
+    pages = []
+
+    with open(file_path, "rb") as f:
+        if size == 0:
+            data = b""
+        else:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            sha256 = hashlib.sha256(data).hexdigest()
+            start = 0
+            while True:
+                pos = data.find(marker_bytes, start)
+                end = size if pos == -1 else pos
+                # Same rule as the old split(): blank blocks are not pages
+                if keep_blank or data[start:end].decode("utf-8", errors="replace").strip():
+                    pages.append([start, end])
+                if pos == -1:
+                    break
+                start = pos + len(marker_bytes)
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+    index = {
+        "version": INDEX_VERSION,
+        "sha256": sha256,
+        "marker": marker,
+        "size": size,
+        "mtime_ns": mtime_ns,
+        "pages": pages,
+    }
+
+    # Atomic write: concurrent builders never leave a half-written sidecar
+    target = _index_path(file_path, marker)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, target)
+    except OSError:
+        # Read-only storage: the in-memory index still serves this process
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    with _index_lock:
+        _index_cache[(file_path, marker)] = index
+    return index
+
+
+def load_page_index(file_path: str, marker: str) -> dict:
+    """
+    Returns the page index for the file, building it lazily on first access or
+    when the file changed since the index was written.
+    """
+    signature = _file_signature(file_path)
+
+    with _index_lock:
+        index = _index_cache.get((file_path, marker))
+    if index and _is_valid(index, marker, signature):
+        return index
+
+    try:
+        with open(_index_path(file_path, marker), "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if _is_valid(index, marker, signature):
+            with _index_lock:
+                _index_cache[(file_path, marker)] = index
+            return index
+    except (OSError, ValueError):
+        pass
+
+    return build_page_index(file_path, marker)
+
+
+def _read_page(f, start: int, end: int) -> str:
+    f.seek(start)
+    text = f.read(end - start).decode("utf-8")
+    # Match the newline translation of text-mode reads
+    return text.replace("\r\n", "\n").replace("\r", "\n").strip()
+
+
+def document_key(index: dict) -> str:
+    """Identifies the paged text by content and marker: same bytes + same marker = same pages."""
+    marker_digest = hashlib.md5(index["marker"].encode("utf-8")).hexdigest()[:8]
+    return f"{index['sha256']}-{marker_digest}"
+
+
+def iter_pages(file_path: str, marker: str):
+    """Yields (page_num, content) for every page of the file, in order, with one file handle."""
+    pages = load_page_index(file_path, marker)["pages"]
+    with open(file_path, "rb") as f:
+        for page_num, (start, end) in enumerate(pages, start=1):
+            yield page_num, _read_page(f, start, end)
+
+
+def read_pages(file_path: str, marker: str, page_nums):
+    """
+    Returns ({page_num: content}, {page_num: error message}) for the requested pages,
+    from a single index lookup and one open file handle (pages read in file order).
+    Every page lands in exactly one of the two dicts, so callers can tell text from errors.
+    """
+    page_nums = sorted(set(page_nums))
+
     if not os.path.exists(file_path):
-        return "Arquivo de texto não encontrado."
+        return {}, {pg: "Arquivo de texto não encontrado." for pg in page_nums}
 
     if not marker:
-        # If no marker, return whole text or just first chunk? 
         # Requirement implies mapping evidence page to text. Without marker, impossible.
-        return "Marcador de página não definido para este processo. Não é possível localizar a página específica."
+        msg = "Marcador de página não definido para este processo. Não é possível localizar a página específica."
+        return {}, {pg: msg for pg in page_nums}
 
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            full_text = f.read()
+        pages = load_page_index(file_path, marker)["pages"]
+        found, errors = {}, {}
+        with open(file_path, "rb") as f:
+            for pg in page_nums:
+                # Adjust index (page_num 1 -> index 0)
+                if 1 <= pg <= len(pages):
+                    start, end = pages[pg - 1]
+                    found[pg] = _read_page(f, start, end)
+                else:
+                    errors[pg] = f"Página {pg} não encontrada no texto (Total de páginas identificadas: {len(pages)})."
+        return found, errors
     except Exception as e:
-        return f"Erro ao ler arquivo: {str(e)}"
-
-    # Splitting logic
-    # We assume markers separate pages.
-    # Example: [[PAGINA]] Text [[PAGINA]] Text...
-    # Split results in ['', 'Text 1', 'Text 2'...] depending on if marker is at start
-    
-    pages = full_text.split(marker)
-    
-    # Filter out empty strings if marker was at start
-    pages = [p for p in pages if p.strip()]
-
-    # Adjust index (page_num 1 -> index 0)
-    if 1 <= page_num <= len(pages):
-        return pages[page_num - 1].strip()
-    else:
-        return f"Página {page_num} não encontrada no texto (Total de páginas identificadas: {len(pages)})."
+        return {}, {pg: f"Erro ao ler arquivo: {str(e)}" for pg in page_nums}
+
+
+def get_pages(file_path: str, marker: str, page_nums) -> dict:
+    """
+    Returns {page_num: content} for all requested pages (see read_pages).
+    Missing pages and errors are reported per page with the same messages as get_page_content.
+    """
+    found, errors = read_pages(file_path, marker, page_nums)
+    return {pg: found[pg] if pg in found else errors[pg] for pg in sorted(set(page_nums))}
+
+
+def get_page_content(file_path: str, marker: str, page_num: int) -> str:
+    """
+    Returns the content of the specific page, using the marker-based page index.
+    Page numbers are assumed to be 1-based logic (User says "Page 1", we look for 1st block).
+
+    If no marker is provided or file doesn't exist, returns a specific error string.
+    """
+    return get_pages(file_path, marker, [page_num])[page_num]
@@ -0,0 +1,243 @@
+import hashlib
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+from loguru import logger
+from sqlalchemy.orm import Session
+from .database import SessionLocal
+from .models import UploadParcial, ArquivoArmazenado
+from . import storage_service
+
+# Chunked, resumable uploads: init -> PUT chunks by offset -> finalize.
+# Chunks are appended to uploads/tmp/<id>.part (same filesystem as the content
+# store), so finalizing is a rename, never a copy.
+MAX_CHUNK_SIZE = int(os.getenv("UPLOAD_MAX_CHUNK_BYTES", 16 * 1024 * 1024))
+# Only process PDFs come this way. The store is served under /static by extension,
+# so a client-chosen one (".html") would be served back as an active page.
+UPLOAD_EXTENSIONS = {".pdf"}
+
+# Running sha256 per upload while chunks arrive in order; rebuilt from disk if lost
+# (server restart), so finalize does not have to re-read 300 MB in the common case.
+_hashers = {}
+_hashers_lock = threading.Lock()
+# Uploads with a chunk being written right now (one at a time per upload)
+_writing = set()
+# Uploads left open (or finalized but never used) longer than this are discarded at startup
+UPLOAD_TTL_HOURS = float(os.getenv("UPLOAD_TTL_HOURS", 24))
+
+
+class UploadError(Exception):
+    """Upload protocol error; status_code maps to the HTTP response."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def create_upload(db: Session, nome_arquivo: str, tamanho_total: int, sha256: str = None) -> UploadParcial:
+    if tamanho_total <= 0:
+        raise UploadError(400, "Tamanho total inválido.")
+    extensao = os.path.splitext(nome_arquivo)[1].lower()
+    if extensao not in UPLOAD_EXTENSIONS:
+        raise UploadError(415, "Tipo de arquivo não suportado: envie um PDF.")
+    upload_id = uuid.uuid4().hex
+    buffer, tmp_path = storage_service.new_temp_file()
+    buffer.close()
+    upload = UploadParcial(
+        id=upload_id,
+        nome_arquivo=nome_arquivo,
+        extensao=extensao,
+        tamanho_total=tamanho_total,
+        recebido=0,
+        sha256_esperado=sha256.lower() if sha256 else None,
+        caminho_tmp=tmp_path,
+        status="aberto",
+    )
+    db.add(upload)
+    db.commit()
+    db.refresh(upload)
+    with _hashers_lock:
+        _hashers[upload_id] = (hashlib.sha256(), 0)
+    return upload
+
+
+def get_upload(db: Session, upload_id: str) -> UploadParcial:
+    upload = db.query(UploadParcial).filter(UploadParcial.id == upload_id).first()
+    if not upload:
+        raise UploadError(404, "Upload não encontrado.")
+    return upload
+
+
+def _write_piece(f, data: bytes, *hashers):
+    for hasher in hashers:
+        hasher.update(data)
+    f.write(data)
+
+
+async def write_chunk_async(db: Session, upload_id: str, offset: int, stream, chunk_sha256: str = None) -> UploadParcial:
+    """
+    Writes one chunk at the given offset, streaming the request body into the part file
+    on the upload I/O threads: nothing is buffered whole, and a body longer than
+    MAX_CHUNK_SIZE is rejected whatever its Content-Length said. Chunks must arrive in
+    order: a client that lost track (or is resuming) reads `recebido` from the upload
+    state and continues there. Re-sending an already stored chunk is accepted and ignored.
+    """
+    upload = await storage_service.run_io(get_upload, db, upload_id)
+    if upload.status != "aberto":
+        raise UploadError(409, "Upload já finalizado.")
+    if offset < upload.recebido:
+        # Re-sent chunk (its answer got lost): fine if it was stored whole
+        tamanho = 0
+        async for piece in stream:
+            tamanho += len(piece)
+            if tamanho > MAX_CHUNK_SIZE:
+                raise UploadError(413, f"Parte maior que o limite de {MAX_CHUNK_SIZE} bytes.")
+        if offset + tamanho <= upload.recebido:
+            return upload
+        raise UploadError(409, f"Offset inesperado: esperado {upload.recebido}.")
+    if offset != upload.recebido:
+        raise UploadError(409, f"Offset inesperado: esperado {upload.recebido}.")
+
+    with _hashers_lock:
+        if upload_id in _writing:
+            raise UploadError(409, "Outra parte deste upload está sendo enviada.")
+        _writing.add(upload_id)
+        running, hashed = _hashers.get(upload_id, (None, 0))
+    try:
+        # The running file hash only advances if the chunk is kept
+        running = running.copy() if running is not None and hashed == offset else None
+        chunk_hasher = hashlib.sha256()
+        hashers = (chunk_hasher, running) if running is not None else (chunk_hasher,)
+        tamanho = 0
+        f = await storage_service.run_io(open, upload.caminho_tmp, "r+b")
+        try:
+            f.seek(offset)
+            pending = bytearray()
+            async for piece in stream:
+                tamanho += len(piece)
+                if tamanho > MAX_CHUNK_SIZE:
+                    raise UploadError(413, f"Parte maior que o limite de {MAX_CHUNK_SIZE} bytes.")
+                if offset + tamanho > upload.tamanho_total:
+                    raise UploadError(400, "A parte ultrapassa o tamanho total declarado.")
+                pending += piece
+                if len(pending) >= storage_service.CHUNK_SIZE:
+                    await storage_service.run_io(_write_piece, f, bytes(pending), *hashers)
+                    pending.clear()
+            if pending:
+                await storage_service.run_io(_write_piece, f, bytes(pending), *hashers)
+            if chunk_sha256 and chunk_hasher.hexdigest() != chunk_sha256.lower():
+                raise UploadError(422, "Checksum da parte não confere; reenvie a parte.")
+        except Exception:
+            # Nothing of a rejected or interrupted chunk counts
+            await storage_service.run_io(f.truncate, offset)
+            raise
+        finally:
+            await storage_service.run_io(f.close)
+
+        with _hashers_lock:
+            if running is not None:
+                _hashers[upload_id] = (running, offset + tamanho)
+        upload.recebido = offset + tamanho
+        upload.atualizado_em = datetime.utcnow()
+        await storage_service.run_io(db.commit)
+        return upload
+    finally:
+        with _hashers_lock:
+            _writing.discard(upload_id)
+
+
+def _file_sha256(upload: UploadParcial) -> str:
+    with _hashers_lock:
+        hasher, hashed = _hashers.pop(upload.id, (None, 0))
+    if hasher is not None and hashed == upload.tamanho_total:
+        return hasher.hexdigest()
+
+    hasher = hashlib.sha256()
+    with open(upload.caminho_tmp, "rb") as f:
+        for chunk in iter(lambda: f.read(storage_service.CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def finalize_upload(db: Session, upload_id: str) -> UploadParcial:
+    """Checks size and checksum, then moves the file into the content store."""
+    upload = get_upload(db, upload_id)
+    if upload.status != "aberto":
+        return upload
+    if upload.recebido != upload.tamanho_total:
+        raise UploadError(409, f"Upload incompleto: {upload.recebido} de {upload.tamanho_total} bytes.")
+
+    sha256 = _file_sha256(upload)
+    if upload.sha256_esperado and sha256 != upload.sha256_esperado:
+        raise UploadError(422, "Checksum do arquivo não confere com o informado no início do upload.")
+
+    arquivo = storage_service.publish_temp_file(db, upload.caminho_tmp, sha256, upload.tamanho_total, upload.extensao)
+    upload.status = "finalizado"
+    upload.sha256 = sha256
+    upload.caminho = arquivo.caminho
+    upload.atualizado_em = datetime.utcnow()
+    db.commit()
+    logger.info(f"Upload {upload_id} finalizado: {upload.nome_arquivo} ({upload.tamanho_total} bytes)")
+    return upload
+
+
+def consume_upload(db: Session, upload_id: str, extensao: str = ".pdf") -> ArquivoArmazenado:
+    """
+    Hands the stored file of a finalized upload over to a record (processo), checking
+    it was stored with the extension the caller expects. The reference taken on
+    finalize moves with it, so an upload can be used only once.
+    """
+    upload = get_upload(db, upload_id)
+    if upload.status != "finalizado":
+        raise UploadError(409, "Upload não finalizado ou já utilizado.")
+    if upload.extensao != extensao or not upload.caminho.endswith(extensao):
+        raise UploadError(415, f"O upload não é um arquivo {extensao}.")
+    upload.status = "consumido"
+    db.commit()
+    return db.query(ArquivoArmazenado).filter(ArquivoArmazenado.sha256 == upload.sha256).first()
+
+
+def _discard(db: Session, upload: UploadParcial):
+    if upload.status == "aberto" and os.path.exists(upload.caminho_tmp):
+        os.remove(upload.caminho_tmp)
+    elif upload.status == "finalizado":
+        storage_service.release(db, upload.caminho)
+    with _hashers_lock:
+        _hashers.pop(upload.id, None)
+    db.delete(upload)
+    db.commit()
+
+
+def abort_upload(db: Session, upload_id: str):
+    _discard(db, get_upload(db, upload_id))
+
+
+def expire_uploads():
+    """
+    Called at startup. Uploads untouched for UPLOAD_TTL_HOURS are discarded with their
+    temp files (or the stored reference a finalized, never used upload still holds),
+    and so are temp files older than that which no open upload writes to (left behind
+    by a crash mid-request).
+    """
+    limite = datetime.utcnow() - timedelta(hours=UPLOAD_TTL_HOURS)
+    db = SessionLocal()
+    try:
+        expirados = db.query(UploadParcial).filter(UploadParcial.atualizado_em < limite).all()
+        for upload in expirados:
+            _discard(db, upload)
+
+        em_uso = {os.path.abspath(caminho) for (caminho,) in
+                  db.query(UploadParcial.caminho_tmp).filter(UploadParcial.status == "aberto")}
+        orfaos = 0
+        if os.path.isdir(storage_service.TMP_DIR):
+            for entry in os.scandir(storage_service.TMP_DIR):
+                if (entry.is_file() and os.path.abspath(entry.path) not in em_uso
+                        and datetime.utcfromtimestamp(entry.stat().st_mtime) < limite):
+                    os.remove(entry.path)
+                    orfaos += 1
+        if expirados or orfaos:
+            logger.info(f"Uploads expirados: {len(expirados)} descartados, {orfaos} arquivos temporários removidos")
+    finally:
+        db.close()
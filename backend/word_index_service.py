@@ -0,0 +1,204 @@
+import os
+import re
+import tempfile
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from difflib import SequenceMatcher
+
+import numpy as np
+import pymupdf
+from loguru import logger
+
+# Word-box index sidecar: "<pdf>.palavras.npz" next to the PDF (removed with it, see
+# storage_service.release). Columnar arrays over every word of the document, in reading
+# order: x0/y0/x1/y1 (PDF points, top-left origin), linha (line id, for merging boxes),
+# the words as one UTF-8 blob plus offsets, and per page the index of its first word and
+# its size. A page lookup is a slice, so highlighting needs no text scan of the page.
+INDEX_SUFFIX = ".palavras.npz"
+INDEX_VERSION = 1
+LOADED_MAX_ENTRIES = int(os.getenv("WORD_INDEX_CACHE_ENTRIES", 8))
+
+_loaded = OrderedDict()  # (path, mtime_ns) -> arrays, most recently used last
+_loaded_lock = threading.Lock()
+
+_TOKEN = re.compile(r"\w+")
+
+
+def index_path(pdf_path: str) -> str:
+    return f"{pdf_path}{INDEX_SUFFIX}"
+
+
+def _fold(value: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", value.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokens(value: str):
+    """Accent and case-insensitive word tokens (punctuation dropped)."""
+    return _TOKEN.findall(_fold(value))
+
+
+def _extract_page(page):
+    """(boxes, linhas, words) of one page; linhas are (block, line) pairs."""
+    words = page.get_text("words")
+    boxes = [w[:4] for w in words]
+    linhas = [(w[5], w[6]) for w in words]
+    return boxes, linhas, [w[4] for w in words]
+
+
+def build_index(pdf_path: str) -> str:
+    """
+    Extracts every page's words with their boxes into the sidecar. Returns its path, or
+    None when the PDF was removed meanwhile (no sidecar is left behind).
+    """
+    start = time.perf_counter()
+    boxes, linhas, blob, offsets = [], [], bytearray(), [0]
+    inicio_pagina, largura, altura = [], [], []
+    linha_id = -1
+    with pymupdf.open(pdf_path) as doc:
+        for page in doc:
+            inicio_pagina.append(len(boxes))
+            largura.append(page.rect.width)
+            altura.append(page.rect.height)
+            page_boxes, page_linhas, page_words = _extract_page(page)
+            previous = None
+            for box, linha, word in zip(page_boxes, page_linhas, page_words):
+                if linha != previous:
+                    linha_id += 1
+                    previous = linha
+                boxes.append(box)
+                linhas.append(linha_id)
+                blob += word.encode("utf-8")
+                offsets.append(len(blob))
+    inicio_pagina.append(len(boxes))
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(pdf_path), suffix=".part")
+    with os.fdopen(fd, "wb") as f:
+        np.savez(
+            f,
+            versao=np.array([INDEX_VERSION], dtype=np.uint32),
+            caixas=np.array(boxes, dtype=np.float32).reshape(-1, 4),
+            linha=np.array(linhas, dtype=np.uint32),
+            offsets=np.array(offsets, dtype=np.uint64),
+            texto=np.frombuffer(bytes(blob), dtype=np.uint8),
+            inicio_pagina=np.array(inicio_pagina, dtype=np.uint32),
+            largura=np.array(largura, dtype=np.float32),
+            altura=np.array(altura, dtype=np.float32),
+        )
+    path = index_path(pdf_path)
+    os.replace(tmp_path, path)
+    if not os.path.exists(pdf_path):
+        # The PDF was released (replaced, linearized) while indexing: its sidecars are only
+        # deleted together with it, so this one would never be
+        os.remove(path)
+        logger.info(f"Índice de palavras descartado: o PDF foi removido durante a indexação ({pdf_path})")
+        return None
+    logger.info(f"Índice de palavras do PDF: {len(boxes)} palavras em {len(largura)} páginas "
+                f"({time.perf_counter() - start:.1f}s, {os.path.getsize(path) // 1024} KB)")
+    return path
+
+
+def _load_index(pdf_path: str):
+    """Arrays of the sidecar (kept in memory, LRU), or None if missing or outdated."""
+    path = index_path(pdf_path)
+    try:
+        key = (path, os.stat(path).st_mtime_ns)
+    except FileNotFoundError:
+        return None
+    with _loaded_lock:
+        if key in _loaded:
+            _loaded.move_to_end(key)
+            return _loaded[key]
+    with np.load(path) as npz:
+        arrays = {name: npz[name] for name in npz.files}
+    if int(arrays["versao"][0]) != INDEX_VERSION:
+        return None
+    with _loaded_lock:
+        _loaded[key] = arrays
+        while len(_loaded) > LOADED_MAX_ENTRIES:
+            _loaded.popitem(last=False)
+    return arrays
+
+
+def page_words(pdf_path: str, pagina: int):
+    """
+    (boxes, linhas, words, largura, altura) of a page, from the sidecar or, when the
+    document was not indexed yet, straight from the PDF. ValueError if the page does not exist.
+    """
+    arrays = _load_index(pdf_path)
+    if arrays is None:
+        with pymupdf.open(pdf_path) as doc:
+            if not 1 <= pagina <= doc.page_count:
+                raise ValueError(f"Página {pagina} não existe.")
+            page = doc[pagina - 1]
+            boxes, linhas, words = _extract_page(page)
+            return boxes, linhas, words, page.rect.width, page.rect.height
+
+    total = len(arrays["largura"])
+    if not 1 <= pagina <= total:
+        raise ValueError(f"Página {pagina} não existe.")
+    first, last = int(arrays["inicio_pagina"][pagina - 1]), int(arrays["inicio_pagina"][pagina])
+    offsets = arrays["offsets"][first:last + 1]
+    blob = arrays["texto"][int(offsets[0]):int(offsets[-1])].tobytes()
+    base = int(offsets[0])
+    words = [blob[int(a) - base:int(b) - base].decode("utf-8") for a, b in zip(offsets[:-1], offsets[1:])]
+    return (arrays["caixas"][first:last].tolist(), arrays["linha"][first:last].tolist(), words,
+            float(arrays["largura"][pagina - 1]), float(arrays["altura"][pagina - 1]))
+
+
+def _match_text(words, texto: str):
+    """Indexes of the page words covered by the evidence text (runs of matching tokens)."""
+    page_tokens, owners = [], []
+    for i, word in enumerate(words):
+        for token in tokens(word):
+            page_tokens.append(token)
+            owners.append(i)
+    target = tokens(texto)
+    if not page_tokens or not target:
+        return set()
+    # Isolated one- or two-token matches ("de", "a fls") are noise in a long excerpt
+    min_run = min(3, len(target))
+    matcher = SequenceMatcher(None, page_tokens, target, autojunk=False)
+    matched = set()
+    for block in matcher.get_matching_blocks():
+        if block.size >= min_run:
+            matched.update(owners[block.a:block.a + block.size])
+    return matched
+
+
+def _match_terms(words, termos: str):
+    """Indexes of the page words containing a search term (prefix match, like the text search)."""
+    terms = tokens(termos)
+    return {i for i, word in enumerate(words) if any(t.startswith(term) for t in tokens(word) for term in terms)}
+
+
+def _merge_boxes(boxes, linhas, indexes):
+    """One rectangle per run of consecutive highlighted words on the same line."""
+    rects = []
+    previous = None
+    for i in sorted(indexes):
+        x0, y0, x1, y1 = boxes[i]
+        if previous is not None and i == previous + 1 and linhas[i] == linhas[previous]:
+            r = rects[-1]
+            rects[-1] = [min(r[0], x0), min(r[1], y0), max(r[2], x1), max(r[3], y1)]
+        else:
+            rects.append([x0, y0, x1, y1])
+        previous = i
+    return [[round(v, 1) for v in r] for r in rects]
+
+
+def highlight(pdf_path: str, pagina: int, texto: str = None, termos: str = None) -> dict:
+    """
+    Rectangles to paint on a page (PDF points, origin at the top-left corner, with the
+    page size so clients can scale them): the words of an evidence text, or of search terms.
+    """
+    boxes, linhas, words, largura, altura = page_words(pdf_path, pagina)
+    indexes = _match_text(words, texto) if texto else _match_terms(words, termos or "")
+    return {
+        "pagina": pagina,
+        "largura": round(largura, 1),
+        "altura": round(altura, 1),
+        "retangulos": _merge_boxes(boxes, linhas, indexes),
+    }
@@ -0,0 +1,89 @@
+"""
+Benchmark: heavy list endpoints, response_model path vs fast JSON path.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_json [n_rows] [repeats]
+
+Uses a temporary DATA_PATH. Imports n_rows Mapeamento + n_rows Catalogador rows
+(2 * n_rows evidences) into one process, adds n_rows chat messages to a session,
+then times GET /processos/{id}/evidencias, /processos and
+/chat_sessions/{id}/messages with backend.fast_json.ENABLED off (ORM objects +
+pydantic + jsonable_encoder) and on (SQL rows + orjson), checking both bodies match.
+"""
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATA_PATH", tempfile.mkdtemp(prefix="bench_json_"))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from backend.main import app  # noqa: E402
+from backend.database import SessionLocal  # noqa: E402
+from backend.models import Processo, ChatSession, ChatMessage  # noqa: E402
+from backend import etl_service, fast_json  # noqa: E402
+from benchmarks.bench_etl import make_sheets  # noqa: E402
+
+
+def seed(n_rows: int):
+    db = SessionLocal()
+    try:
+        processo = etl_service.create_processo(db, "bench-json", "Benchmark JSON", "uploads/bench.pdf")
+        folder = tempfile.mkdtemp()
+        map_path, cat_path = make_sheets(n_rows, folder)
+        etl_service.import_mapeamento(db, processo.id, map_path)
+        etl_service.import_catalogador(db, processo.id, cat_path)
+
+        for i in range(99):
+            db.add(Processo(numero_processo=f"bench-{i}", nome_descricao="Benchmark", caminho_pdf="uploads/x.pdf"))
+        session = ChatSession(processo_id=processo.id, name="bench")
+        db.add(session)
+        db.flush()
+        base = datetime(2024, 1, 1)
+        db.execute(ChatMessage.__table__.insert(), [
+            {"session_id": session.id, "role": "user" if i % 2 else "model",
+             "content": f"Mensagem {i} " * 20, "created_at": base + timedelta(seconds=i)}
+            for i in range(n_rows)
+        ])
+        db.commit()
+        return processo.id, session.id
+    finally:
+        db.close()
+
+
+def timed(client, url, repeats: int):
+    samples = []
+    body = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        resp = client.get(url)
+        samples.append(time.perf_counter() - start)
+        resp.raise_for_status()
+        body = resp.content
+    return statistics.median(samples), body
+
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    with TestClient(app) as client:  # runs the app startup (tables, migrations)
+        processo_id, session_id = seed(n_rows)
+
+        print(f"orjson: {'yes' if fast_json.orjson else 'no (stdlib fallback)'}")
+        print(f"{'endpoint':<36} {'items':>7} {'default':>10} {'fast':>10} {'speedup':>8}  same body")
+        for url in (f"/processos/{processo_id}/evidencias", "/processos", f"/chat_sessions/{session_id}/messages"):
+            fast_json.ENABLED = False
+            slow, slow_body = timed(client, url, repeats)
+            fast_json.ENABLED = True
+            fast, fast_body = timed(client, url, repeats)
+            same = json.loads(slow_body) == json.loads(fast_body)
+            items = len(json.loads(fast_body))
+            print(f"{url:<36} {items:>7} {slow * 1000:>8.0f}ms {fast * 1000:>8.0f}ms {slow / fast:>7.1f}x  {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark: text extraction throughput (pages/sec) of a PDF, serial vs process pool.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_text_extraction [n_pages] [workers ...]
+
+Generates a synthetic n_pages PDF (default 3000, a dense paragraph per page) and
+extracts its text: once in-process with a plain page loop (the baseline), then with
+extraction_service.extract_text for each worker count (default: 1 and every core),
+each in a fresh process with PROCESS_WORKERS set. The pool is warmed up before timing,
+as it is in a running server.
+"""
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import pymupdf
+
+PARAGRAPH = ("Aos {n} dias do mês, compareceu a parte requerente, que apresentou o contrato social, "
+             "as notas fiscais e os comprovantes de pagamento juntados às fls. {n}, requerendo a "
+             "expedição de ofício ao banco depositário para informar a movimentação da conta. ")
+
+
+def make_pdf(n_pages: int, folder: str) -> str:
+    path = os.path.join(folder, f"bench_{n_pages}.pdf")
+    doc = pymupdf.open()
+    for n in range(1, n_pages + 1):
+        page = doc.new_page()
+        page.insert_textbox(pymupdf.Rect(50, 50, 545, 790), PARAGRAPH.format(n=n) * 8, fontsize=10)
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def report(label: str, n_pages: int, elapsed: float):
+    print(f"{label:<18} {n_pages} páginas em {elapsed:6.2f}s  {n_pages / elapsed:8.0f} páginas/s")
+
+
+def run_serial(pdf_path: str):
+    start = time.perf_counter()
+    with pymupdf.open(pdf_path) as doc:
+        texts = [page.get_text("text") for page in doc]
+    report("serial", len(texts), time.perf_counter() - start)
+
+
+def run_pool(pdf_path: str):
+    from backend import extraction_service, process_pool
+
+    with tempfile.TemporaryDirectory() as folder:
+        # Warm-up: spawns the workers
+        warm = os.path.join(folder, "warm.pdf")
+        with pymupdf.open() as doc:
+            for _ in range(process_pool.PROCESS_WORKERS * 2):
+                doc.new_page()
+            doc.save(warm)
+        extraction_service.extract_text(warm, io.BytesIO())
+
+    start = time.perf_counter()
+    paginas = extraction_service.extract_text(pdf_path, io.BytesIO())
+    report(f"pool {process_pool.PROCESS_WORKERS} processos", paginas, time.perf_counter() - start)
+    process_pool.shutdown()
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--pool":
+        run_pool(sys.argv[2])
+        return
+
+    n_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    workers = sys.argv[2:] or sorted({"1", str(os.cpu_count() or 1)})
+    folder = tempfile.mkdtemp(prefix="bench_extract_")
+    pdf_path = make_pdf(n_pages, folder)
+    print(f"PDF sintético: {os.path.getsize(pdf_path) // 1024} KB")
+    run_serial(pdf_path)
+    for n in workers:
+        env = dict(os.environ, PROCESS_WORKERS=n)
+        subprocess.run([sys.executable, "-m", "benchmarks.bench_text_extraction", "--pool", pdf_path],
+                       env=env, check=True)
+
+
+if __name__ == "__main__":
+    main()
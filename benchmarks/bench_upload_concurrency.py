@@ -0,0 +1,111 @@
+"""
+Benchmark: evidence listing latency while large uploads are running.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_upload_concurrency [n_uploaders] [upload_mb] [duration_s]
+
+Starts the API with uvicorn on a free port (temporary DATA_PATH), creates a
+process, then measures GET /processos/{id}/evidencias latency first idle and then
+while n_uploaders threads keep posting upload_mb PDFs to /processos/{id}/upload.
+Uploaded blobs land in backend/static/uploads/cas (ignored by git).
+"""
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(base_url: str, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(base_url + "/", timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("API did not start")
+
+
+def measure(url: str, duration: float):
+    latencies = []
+    end = time.time() + duration
+    while time.time() < end:
+        start = time.perf_counter()
+        requests.get(url, timeout=60)
+        latencies.append((time.perf_counter() - start) * 1000)
+        time.sleep(0.05)
+    return latencies
+
+
+def report(label: str, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) >= 20 else max(latencies)
+    print(f"{label:<22} n={len(latencies):<4} p50={statistics.median(latencies):7.1f} ms  "
+          f"p95={p95:7.1f} ms  max={max(latencies):7.1f} ms")
+
+
+def main():
+    n_uploaders = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    upload_mb = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    duration = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory() as data_path:
+        env = {**os.environ, "DATA_PATH": data_path}
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--log-level", "warning"],
+            env=env,
+        )
+        try:
+            wait_ready(base_url)
+            resp = requests.post(f"{base_url}/processos", data={"numero": "bench", "nome": "bench"},
+                                 files={"file_pdf": ("bench.pdf", b"%PDF-1.4 bench")})
+            processo_id = resp.json()["id"]
+            list_url = f"{base_url}/processos/{processo_id}/evidencias"
+
+            report("idle", measure(list_url, duration / 2))
+
+            stop = threading.Event()
+            uploaded = [0]
+
+            def uploader(seed: int):
+                # Distinct content per request, so deduplication does not skip the write
+                payload = bytearray(os.urandom(1024)) * (upload_mb * 1024)
+                counter = 0
+                while not stop.is_set():
+                    counter += 1
+                    payload[:16] = f"{seed:08d}{counter:08d}".encode()
+                    requests.post(f"{base_url}/processos/{processo_id}/upload",
+                                  files={"file": ("big.pdf", bytes(payload))}, timeout=300)
+                    uploaded[0] += upload_mb
+
+            threads = [threading.Thread(target=uploader, args=(i,), daemon=True) for i in range(n_uploaders)]
+            for t in threads:
+                t.start()
+            time.sleep(1)
+            report(f"{n_uploaders} x {upload_mb} MB uploads", measure(list_url, duration))
+            stop.set()
+            for t in threads:
+                t.join()
+            print(f"uploaded {uploaded[0]} MB during the run")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
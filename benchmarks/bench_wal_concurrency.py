@@ -0,0 +1,108 @@
+"""
+Benchmark: evidence listing reads while a bulk import is writing.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_wal_concurrency [n_rows] [n_readers]
+
+Runs the same scenario once per SQLite journal mode (DELETE, the old default, and
+WAL, the production profile), each in a fresh process with its own temporary
+DATA_PATH: a seeded process is listed in a loop by n_readers threads while
+another thread imports n_rows Mapeamento + n_rows Catalogador rows into a second
+process. Reports how many reads completed during the import, their latency and
+how many failed with "database is locked".
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+MODES = ("DELETE", "WAL")
+
+
+def run_scenario(n_rows: int, n_readers: int):
+    from sqlalchemy.exc import OperationalError
+    from backend.database import SessionLocal, SQLITE_PRAGMAS, engine, Base
+    from backend import etl_service, evidencia_service, migrate_db, search_service
+    from benchmarks.bench_etl import make_sheets
+
+    Base.metadata.create_all(bind=engine)
+    migrate_db.migrate(engine)
+    search_service.ensure_schema(engine)
+
+    db = SessionLocal()
+    seeded = etl_service.create_processo(db, "wal-leitura", "Leitura", "uploads/a.pdf")
+    map_path, cat_path = make_sheets(1000, tempfile.mkdtemp())
+    etl_service.import_mapeamento(db, seeded.id, map_path)
+    target = etl_service.create_processo(db, "wal-escrita", "Escrita", "uploads/b.pdf")
+    seeded_id, target_id = seeded.id, target.id
+    db.close()
+    big_map, big_cat = make_sheets(n_rows, tempfile.mkdtemp())
+
+    importing = threading.Event()
+    done = threading.Event()
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def reader():
+        importing.wait()
+        while not done.is_set():
+            session = SessionLocal()
+            start = time.perf_counter()
+            try:
+                evidencia_service.list_unificadas(session, seeded_id, limit=100)
+                with lock:
+                    latencies.append((time.perf_counter() - start) * 1000)
+            except OperationalError:
+                with lock:
+                    errors.append(1)
+            finally:
+                session.close()
+
+    def writer():
+        session = SessionLocal()
+        try:
+            importing.set()
+            etl_service.import_mapeamento(session, target_id, big_map)
+            etl_service.import_catalogador(session, target_id, big_cat)
+        finally:
+            session.close()
+            done.set()
+
+    threads = [threading.Thread(target=reader) for _ in range(n_readers)]
+    for t in threads:
+        t.start()
+    start = time.perf_counter()
+    writer()
+    elapsed = time.perf_counter() - start
+    for t in threads:
+        t.join()
+
+    mode = SQLITE_PRAGMAS["journal_mode"]
+    if latencies:
+        p50 = statistics.median(latencies)
+        print(f"{mode:<8} import={elapsed:6.1f}s  reads={len(latencies):<6} reads/s={len(latencies) / elapsed:8.1f}  "
+              f"p50={p50:7.1f} ms  max={max(latencies):8.1f} ms  locked={len(errors)}")
+    else:
+        print(f"{mode:<8} import={elapsed:6.1f}s  reads=0  locked={len(errors)}")
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--scenario":
+        run_scenario(int(sys.argv[2]), int(sys.argv[3]))
+        return
+
+    n_rows = sys.argv[1] if len(sys.argv) > 1 else "50000"
+    n_readers = sys.argv[2] if len(sys.argv) > 2 else "4"
+    for mode in MODES:
+        env = dict(os.environ, SQLITE_JOURNAL_MODE=mode, DATA_PATH=tempfile.mkdtemp(prefix="bench_wal_"),
+                   SQLITE_BUSY_TIMEOUT_MS="5000", LOGURU_LEVEL="WARNING")
+        env.pop("DATABASE_URL", None)
+        subprocess.run([sys.executable, "-m", "benchmarks.bench_wal_concurrency", "--scenario", n_rows, n_readers],
+                       env=env, check=True)
+
+
+if __name__ == "__main__":
+    main()
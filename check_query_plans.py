@@ -0,0 +1,113 @@
+"""
+Checks that the evidence listing hot paths are served by the composite indexes
+(no full table scans, listing read in index order). Runs against a throwaway SQLite database:
+
+    python check_query_plans.py
+
+Exits with status 1 and prints the offending plan if an assertion fails.
+"""
+import os
+import sys
+import tempfile
+
+os.environ["DATA_PATH"] = tempfile.mkdtemp(prefix="query_plans_")
+
+from sqlalchemy import select, text  # noqa: E402
+from backend.database import engine, Base, SessionLocal  # noqa: E402
+from backend.models import (Processo, EvidenciaMapeada, EvidenciaCatalogada, EvidenciaFaceta,  # noqa: E402
+                            EvidenciaHistogramaPaginas)
+from backend import migrate_db, evidencia_service  # noqa: E402
+
+
+def seed(processos=20, por_processo=500):
+    db = SessionLocal()
+    for pid in range(1, processos + 1):
+        db.add(Processo(id=pid, numero_processo=str(pid), nome_descricao="x"))
+    db.flush()
+    for pid in range(1, processos + 1):
+        db.execute(EvidenciaMapeada.__table__.insert(), [
+            {"processo_id": pid, "tipo_evidencia": f"tipo {i % 7}", "conteudo": "c",
+             "pagina_inicial": i, "pagina_final": i + 1}
+            for i in range(por_processo)
+        ])
+        db.execute(EvidenciaCatalogada.__table__.insert(), [
+            {"processo_id": pid, "origem_tipo": f"origem {i % 5}", "trecho": "t",
+             "pagina_inicial": i, "pagina_final": i}
+            for i in range(por_processo)
+        ])
+    db.commit()
+    evidencia_service.rebuild_all(db)
+    evidencia_service.rebuild_all_facetas(db)
+    db.close()
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+
+
+def query_plan(conn, statement):
+    sql = str(statement.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+    return [row[-1] for row in conn.execute(text("EXPLAIN QUERY PLAN " + sql))]
+
+
+def assert_indexed(conn, label, statement, expected_indexes, index_order=False):
+    plan = query_plan(conn, statement)
+    problems = []
+    if index_order and any("TEMP B-TREE FOR ORDER BY" in line for line in plan):
+        problems.append("sorted in a temp b-tree instead of index order")
+    for line in plan:
+        # FTS5 MATCH lookups are reported as "SCAN <fts> VIRTUAL TABLE INDEX n:M..."
+        if line.startswith("SCAN evidencias_") and "VIRTUAL TABLE INDEX" not in line:
+            problems.append(f"full scan: {line}")
+    for index in expected_indexes:
+        if not any(index in line for line in plan):
+            problems.append(f"index not used: {index}")
+    status = "OK" if not problems else "FALHOU"
+    print(f"[{status}] {label}")
+    for line in plan:
+        print(f"    {line}")
+    for problem in problems:
+        print(f"    -> {problem}")
+    return not problems
+
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    migrate_db.migrate(engine)
+    seed()
+
+    listagem = ["ix_evidencias_unificadas_processo_ordem"]
+    busca = ["evidencias_mapeadas_fts VIRTUAL TABLE INDEX", "evidencias_catalogadas_fts VIRTUAL TABLE INDEX"]
+    checks = [
+        ("listagem por faixa de páginas",
+         evidencia_service.unified_query(3, pg_min=100, pg_max=150, limit=50)[0], listagem, True),
+        ("listagem com cursor",
+         evidencia_service.unified_query(
+             3, pg_max=400, limit=50, cursor=evidencia_service.encode_cursor(200, "mapeada", 1))[0], listagem, True),
+        ("listagem completa do processo",
+         evidencia_service.unified_query(3)[0], listagem, True),
+        ("busca textual por relevância",
+         evidencia_service.unified_query(3, q="certidao", order="relevance", limit=50)[0], busca, False),
+        ("busca textual por página",
+         evidencia_service.unified_query(3, q="certidao", pg_max=400, limit=50)[0], busca, False),
+        ("tipos de evidência (facetas)",
+         select(EvidenciaFaceta.valor).where(EvidenciaFaceta.processo_id == 3, EvidenciaFaceta.faceta == "tipo"),
+         ["sqlite_autoindex_evidencias_facetas_1"], False),
+        ("histograma de páginas",
+         select(EvidenciaHistogramaPaginas).where(EvidenciaHistogramaPaginas.processo_id == 3),
+         ["sqlite_autoindex_evidencias_histograma_paginas_1"], False),
+        # Source tables: only read per processo, to rebuild its unified rows on import
+        ("reconstrução a partir de evidencias_mapeadas",
+         evidencia_service.source_query(3, "mapeada"), ["ix_evidencias_mapeadas_processo_pagina"], False),
+        ("reconstrução a partir de evidencias_catalogadas",
+         evidencia_service.source_query(3, "catalogada"), ["ix_evidencias_catalogadas_processo_pagina"], False),
+    ]
+
+    with engine.connect() as conn:
+        results = [assert_indexed(conn, *check) for check in checks]
+
+    if not all(results):
+        sys.exit(1)
+    print("Todos os planos usam os índices esperados.")
+
+
+if __name__ == "__main__":
+    main()
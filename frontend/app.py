@@ -2,7 +2,10 @@ import streamlit as st
 import requests
 import pandas as pd
 import json
+import time
+import hashlib
 from datetime import datetime
+from urllib.parse import quote, urlencode
 
 import os
 
@@ -41,24 +44,48 @@ def format_date(val):
         return dt.strftime("%d/%m/%Y")
     except:
         return str(val)
-def api_get(endpoint, params=None):
+# Conditional GET cache: bodies of responses that carried an ETag, revalidated with
+# If-None-Match on every rerun (a 304 reuses the stored body).
+HTTP_CACHE_MAX_ENTRIES = 64
+
+def api_get_validado(endpoint, params=None):
+    """GET with ETag revalidation. Returns (body, headers, from_cache); body is None on error."""
     headers = {"Authorization": f"Bearer {st.session_state['token']}"} if st.session_state['token'] else {}
+    cache = st.session_state.setdefault('http_cache', {})
+    key = (endpoint, tuple(sorted((params or {}).items())))
+    cached = cache.get(key)
+    if cached:
+        headers["If-None-Match"] = cached['etag']
     try:
         resp = requests.get(f"{API_URL}/{endpoint}", params=params, headers=headers)
+        if resp.status_code == 304 and cached:
+            return cached['body'], cached['headers'], True
         if resp.status_code == 200:
-            return resp.json()
+            body = resp.json()
+            etag = resp.headers.get("ETag")
+            if etag:
+                cache.pop(key, None)
+                if len(cache) >= HTTP_CACHE_MAX_ENTRIES:
+                    cache.pop(next(iter(cache)))  # oldest entry
+                cache[key] = {'etag': etag, 'body': body, 'headers': resp.headers}
+            return body, resp.headers, False
         elif resp.status_code == 401:
             st.session_state['token'] = None
             st.rerun()
     except Exception as e:
         st.error(f"API Error: {e}")
-    return None
+    return None, {}, False
+
+def api_get(endpoint, params=None):
+    body, _, _ = api_get_validado(endpoint, params)
+    return body
 
 def api_post(endpoint, data=None, files=None):
     headers = {"Authorization": f"Bearer {st.session_state['token']}"} if st.session_state['token'] else {}
     try:
-        if files:
-            # When files are present, do not set Content-Type header manually for multipart
+        if files is not None:
+            # Form endpoint: multipart when files are present, urlencoded otherwise.
+            # Do not set Content-Type header manually for multipart
             resp = requests.post(f"{API_URL}/{endpoint}", data=data, files=files, headers=headers)
         else:
             resp = requests.post(f"{API_URL}/{endpoint}", json=data, headers=headers)
@@ -68,6 +95,95 @@ def api_post(endpoint, data=None, files=None):
         st.error(f"API Error: {e}")
         return None
 
+EVIDENCIAS_PAGE_SIZE = 200
+
+# The list only needs what the sidebar shows; original_data comes from the detail endpoint on click
+EVIDENCIAS_CAMPOS_LISTA = "tipo,resumo_conteudo,pagina_inicial,pagina_final,valor"
+
+def pdf_versao(processo):
+    """sha256 do PDF (nome do arquivo no armazenamento por conteúdo): versiona URLs cacheáveis."""
+    return os.path.splitext(os.path.basename(processo['caminho_pdf']))[0]
+
+def url_miniatura(processo, pagina):
+    base_url = PUBLIC_API_URL.rstrip('/')
+    return f"{base_url}/processos/{processo['id']}/paginas/{pagina}/thumb.png?v={pdf_versao(processo)}"
+
+def carregar_evidencias(proc_id, params, cursor=None):
+    """
+    Fetches one page of evidences. Returns (items, next_cursor, changed): next_cursor is None
+    on the last page; changed is False when the server confirmed the cached page (304).
+    """
+    page_params = dict(params, limit=EVIDENCIAS_PAGE_SIZE, fields=EVIDENCIAS_CAMPOS_LISTA)
+    if cursor:
+        page_params['cursor'] = cursor
+    body, headers, from_cache = api_get_validado(f"processos/{proc_id}/evidencias", page_params)
+    if body is None:
+        return [], None, True
+    return body, headers.get("X-Next-Cursor"), not from_cache
+
+def carregar_detalhe_evidencia(ev):
+    """Full evidence (with original_data), cached per session."""
+    cache = st.session_state.setdefault('ev_detalhes', {})
+    key = (ev['source_type'], ev['id'])
+    if key not in cache:
+        detalhe = api_get(f"evidencias/{ev['source_type']}/{ev['id']}")
+        if not detalhe:
+            return {}
+        cache[key] = detalhe
+    return cache[key]
+
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+UPLOAD_CHUNK_RETRIES = 5
+
+def upload_em_partes(arquivo, progresso=None):
+    """
+    Sends a large file through the resumable chunked upload API and returns the
+    finalized upload id. A failed chunk is retried from the offset the server reports.
+    """
+    headers = {"Authorization": f"Bearer {st.session_state['token']}"} if st.session_state['token'] else {}
+    dados = arquivo.getvalue()
+    total = len(dados)
+
+    resp = requests.post(f"{API_URL}/uploads", json={
+        "nome_arquivo": arquivo.name,
+        "tamanho_total": total,
+        "sha256": hashlib.sha256(dados).hexdigest(),
+    }, headers=headers)
+    resp.raise_for_status()
+    upload_id = resp.json()['id']
+
+    offset = 0
+    falhas = 0
+    while offset < total:
+        parte = dados[offset:offset + UPLOAD_CHUNK_SIZE]
+        try:
+            resp = requests.put(
+                f"{API_URL}/uploads/{upload_id}",
+                params={"offset": offset},
+                data=parte,
+                headers={**headers, "X-Chunk-SHA256": hashlib.sha256(parte).hexdigest()},
+            )
+            if resp.status_code == 200:
+                offset = resp.json()['recebido']
+                falhas = 0
+                if progresso:
+                    progresso.progress(offset / total, text=f"Enviando PDF... {offset // (1024 * 1024)} / {total // (1024 * 1024)} MB")
+                continue
+        except requests.RequestException:
+            pass
+        # Connection blip or rejected chunk: ask the server where to resume
+        falhas += 1
+        if falhas > UPLOAD_CHUNK_RETRIES:
+            raise RuntimeError("Falha ao enviar o arquivo após várias tentativas.")
+        time.sleep(falhas)
+        estado = requests.get(f"{API_URL}/uploads/{upload_id}", headers=headers)
+        if estado.status_code == 200:
+            offset = estado.json()['recebido']
+
+    resp = requests.post(f"{API_URL}/uploads/{upload_id}/finalizar", headers=headers)
+    resp.raise_for_status()
+    return upload_id
+
 # -- Pages --
 
 def login_page():
@@ -116,8 +232,9 @@ def page_novo_processo():
         
         st.markdown("---")
         st.markdown("###### Configuração de Texto para IA (Chatbot)")
-        txt_file = st.file_uploader("Arquivo Texto Extraído (Opcional - Required for Chat)", type="txt")
-        marker = st.text_input("Marcador de Página (ex: [[PAGINA]])", help="String usada para separar as páginas no arquivo texto.")
+        txt_file = st.file_uploader("Arquivo Texto Extraído (Opcional)", type="txt",
+                                    help="Sem ele, o texto é extraído do próprio PDF, página a página.")
+        marker = st.text_input("Marcador de Página (ex: [[PAGINA]])", help="String usada para separar as páginas no arquivo texto enviado.")
         
         submitted = st.form_submit_button("Cadastrar Processo")
         
@@ -125,20 +242,48 @@ def page_novo_processo():
             if not numero or not pdf_file:
                 st.warning("Número e PDF são obrigatórios.")
             else:
-                files = [('file_pdf', pdf_file)]
+                files = []
                 if map_file: files.append(('file_mapeamento', map_file))
                 if cat_file: files.append(('file_catalogador', cat_file))
                 if txt_file: files.append(('file_texto', txt_file))
                 
                 payload = {"numero": numero, "nome": nome, "marcador_pagina": marker}
-                
-                with st.spinner("Enviando e Processando..."):
+
+                # The PDF (up to hundreds of MB) goes through the resumable chunked upload
+                try:
+                    payload["upload_pdf_id"] = upload_em_partes(pdf_file, st.progress(0.0, text="Enviando PDF..."))
+                except Exception as e:
+                    st.error(f"Falha ao enviar o PDF: {e}")
+                    return
+
+                with st.spinner("Enviando arquivos..."):
                     resp = api_post("processos", data=payload, files=files)
-                    if resp and resp.status_code == 200:
-                        st.success("Processo cadastrado com sucesso!")
-                    else:
-                        err = resp.text if resp else "Erro desconhecido"
-                        st.error(f"Falha ao cadastrar: {err}")
+                if resp and resp.status_code == 200:
+                    st.success("Processo cadastrado com sucesso!")
+                    job_id = resp.json().get("job_id")
+                    if job_id:
+                        acompanhar_job(job_id)
+                else:
+                    err = resp.text if resp else "Erro desconhecido"
+                    st.error(f"Falha ao cadastrar: {err}")
+
+def acompanhar_job(job_id, intervalo=1.0):
+    """Polls the ingestion job until it finishes, showing the current step."""
+    status_box = st.empty()
+    while True:
+        job = api_get(f"jobs/{job_id}")
+        if not job:
+            status_box.warning("Não foi possível consultar o andamento da importação.")
+            return
+        if job['status'] == "done":
+            status_box.success(f"Importação concluída: {job['linhas_importadas']} evidências em {job['duracao_segundos']}s.")
+            return
+        if job['status'] == "failed":
+            status_box.error(f"Falha na importação: {job.get('erro') or 'erro desconhecido'}")
+            return
+        etapa = job.get('etapa') or ("na fila" if job['status'] == "queued" else "processando")
+        status_box.info(f"⏳ Importação em andamento: {etapa} ({job['linhas_importadas']} evidências até agora)...")
+        time.sleep(intervalo)
 
 def page_admin():
     st.header("🛠️ Administração")
@@ -192,8 +337,13 @@ def page_dashboard():
     # Load Details
     curr_proc = next((p for p in processos if p['id'] == selected_proc_id), None)
     
-    # Load dynamic Types
-    tipos_disponiveis = api_get(f"processos/{selected_proc_id}/tipos_evidencia") or []
+    # Load dynamic Types (with counts, precomputed at import)
+    facetas = api_get(f"processos/{selected_proc_id}/facetas") or {}
+    # The type filter matches by substring, so "Contrato" also brings "Procuração / Contrato":
+    # split compound types show that combined count; the compound values their own.
+    contagem_tipos = {f['valor']: f['quantidade'] for f in facetas.get('tipos', [])}
+    contagem_tipos.update({f['valor']: f['quantidade'] for f in facetas.get('tipos_componentes', [])})
+    tipos_disponiveis = sorted(contagem_tipos)
     
     # -- Sidebar Content (Filtros & Evidências) --
     st.sidebar.markdown("---")
@@ -201,35 +351,55 @@ def page_dashboard():
     
     # Contextual Filters
     f_q = st.sidebar.text_input("Busca Textual", placeholder="Termo...")
-    f_tipo = st.sidebar.selectbox("Tipo Evidência", options=["Todos"] + tipos_disponiveis)
+    f_relevancia = st.sidebar.checkbox("Ordenar por relevância", value=False, disabled=not f_q)
+    f_tipo = st.sidebar.selectbox(
+        "Tipo Evidência", options=["Todos"] + tipos_disponiveis,
+        format_func=lambda t: f"Todos ({facetas.get('total', 0)})" if t == "Todos" else f"{t} ({contagem_tipos[t]})"
+    )
+    if facetas.get('paginas'):
+        with st.sidebar.expander("📊 Distribuição por páginas", expanded=False):
+            hist = pd.DataFrame(facetas['paginas']).set_index('pagina_inicial')
+            st.bar_chart(hist['quantidade'], x_label="Página inicial da faixa", y_label="Evidências")
+            if facetas.get('sem_pagina'):
+                st.caption(f"{facetas['sem_pagina']} evidência(s) sem página.")
     
     # Fetch Evidence
     params = {}
     if f_q: params['q'] = f_q
+    if f_q and f_relevancia: params['order'] = 'relevance'
     if f_tipo and f_tipo != "Todos": params['tipo'] = f_tipo
     
-    evidencias = api_get(f"processos/{selected_proc_id}/evidencias", params=params) or []
+    # Keyset pagination: pages are appended while the filters stay the same
+    lista_key = (selected_proc_id, f_q, f_relevancia, f_tipo)
+    # The first page is revalidated on every rerun (304 while nothing changed); new data resets the list
+    items, cursor, mudou = carregar_evidencias(selected_proc_id, params)
+    if st.session_state.get('ev_lista_key') != lista_key or mudou:
+        st.session_state['ev_lista_key'] = lista_key
+        st.session_state['ev_detalhes'] = {}
+        st.session_state['ev_items'] = items
+        st.session_state['ev_cursor'] = cursor
+    evidencias = st.session_state['ev_items']
     
-    st.sidebar.markdown(f"**Resultados:** {len(evidencias)}")
+    st.sidebar.markdown(f"**Resultados:** {len(evidencias)}" + ("+" if st.session_state['ev_cursor'] else ""))
     
     # List Evidences in Sidebar
     for ev in evidencias:
         with st.sidebar.expander(f"Pg. {ev['pagina_inicial']} - {ev['tipo'] or ev['source_type'].title()}"):
+            # Prévia da página (miniatura gerada no backend, sem carregar o PDF)
+            if ev['pagina_inicial'] and curr_proc.get('caminho_pdf'):
+                st.image(url_miniatura(curr_proc, ev['pagina_inicial']), width=120)
             # Content
             resumo = ev['resumo_conteudo']
             st.markdown(f"**Resumo:** {resumo}")
             if ev['valor']:
                 st.markdown(f"**Valor:** R$ {ev['valor']}")
             
-            # Full Content logic
-            original = ev.get('original_data', {})
-            completo = original.get('trecho') or original.get('conteudo') or ""
-            
             # Buttons Row
             b1, b2, b3 = st.columns([1,1,1])
             if b1.button("👁️ PDF", key=f"btn_pdf_{ev['source_type']}_{ev['id']}"):
+                # O backend localiza o trecho da evidência na página (índice de palavras do PDF)
                 st.session_state['pdf_page'] = ev['pagina_inicial']
-                st.session_state['pdf_highlight'] = completo
+                st.session_state['pdf_destaque'] = {"evidencia": f"{ev['source_type']}:{ev['id']}"}
             
             if b2.button("📋 Detalhes", key=f"btn_det_{ev['source_type']}_{ev['id']}"):
                 @st.dialog("Detalhes da Evidência", width="large")
@@ -253,7 +423,7 @@ def page_dashboard():
                             with st.expander(f"{field.capitalize()}", expanded=True):
                                 st.markdown(data[field])
 
-                show_details(original, ev['source_type'])
+                show_details(carregar_detalhe_evidencia(ev).get('original_data', {}), ev['source_type'])
 
             if b3.button("📄 Copiar", key=f"btn_txt_{ev['source_type']}_{ev['id']}"):
                 # Fetch text content
@@ -271,6 +441,26 @@ def page_dashboard():
                     else:
                         st.error("Não foi possível obter o texto (Verifique se o arquivo texto foi enviado).")
 
+    if st.session_state['ev_cursor']:
+        if st.sidebar.button("Carregar mais", key="btn_ev_mais"):
+            items, cursor, _ = carregar_evidencias(selected_proc_id, params, st.session_state['ev_cursor'])
+            st.session_state['ev_items'] = evidencias + items
+            st.session_state['ev_cursor'] = cursor
+            st.rerun()
+
+    # -- Full-Text Search over Page Text --
+    st.sidebar.markdown("---")
+    with st.sidebar.expander("🔎 Busca no Texto do Processo", expanded=False):
+        termo = st.text_input("Termo no texto", key=f"busca_texto_{selected_proc_id}")
+        if termo:
+            hits = api_get(f"processos/{selected_proc_id}/busca_texto", params={"q": termo}) or []
+            st.markdown(f"**Páginas encontradas:** {len(hits)}")
+            for hit in hits:
+                st.markdown(f"**Pg. {hit['pagina']}** — {hit['trecho']}")
+                if st.button("👁️ Abrir página", key=f"btn_busca_{hit['pagina']}"):
+                    st.session_state['pdf_page'] = hit['pagina']
+                    st.session_state['pdf_destaque'] = {"q": termo}
+
     # -- Chatbot Section --
     st.sidebar.markdown("---")
     with st.sidebar.expander("💬 Chatbot Especializado", expanded=False):
@@ -338,6 +528,7 @@ def page_dashboard():
 
     # -- Main Content (PDF Viewer Only) --
     st.subheader(f"Visualizador: {curr_proc['numero_processo']}")
+    st.toggle("Documento completo (navegar pelas páginas)", key='pdf_documento_completo')
     render_pdf_viewer(curr_proc, height="1000px")
             
 
@@ -348,16 +539,24 @@ def render_pdf_viewer(processo, height="800px"):
         return
         
     current_page = st.session_state.get('pdf_page', 1)
-    highlight_text = st.session_state.get('pdf_highlight', '')
+    destaque = st.session_state.get('pdf_destaque')
     
     # Limpar API_URL de barras no final (Usar URL PÚBLICA para o Iframe no navegador)
     base_url = PUBLIC_API_URL.rstrip('/')
     
-    # Limpar caminho_pdf de barras no início
-    pdf_path = processo['caminho_pdf'].lstrip('/')
-    
-    full_pdf_url = f"{base_url}/static/{pdf_path}"
-    viewer_url = f"{base_url}/static/viewer.html?file={full_pdf_url}&page={current_page}&highlight={highlight_text}"
+    if st.session_state.get('pdf_documento_completo'):
+        # Documento inteiro por requisições de intervalo: o pdf.js baixa só as páginas exibidas
+        pdf_url = f"{base_url}/processos/{processo['id']}/pdf?v={pdf_versao(processo)}"
+        viewer_page = current_page
+    else:
+        # Uma página só (PDF recortado e cacheado no backend), não o documento inteiro
+        pdf_url = f"{base_url}/processos/{processo['id']}/paginas/{current_page}.pdf"
+        viewer_page = 1
+    viewer_url = f"{base_url}/static/viewer.html?file={quote(pdf_url, safe='')}&page={viewer_page}"
+    if destaque:
+        # Retângulos a destacar na página, calculados no backend
+        highlight_url = f"{base_url}/processos/{processo['id']}/paginas/{current_page}/highlight?{urlencode(destaque)}"
+        viewer_url += f"&highlight={quote(highlight_url, safe='')}"
     
     st.markdown(
         f'<iframe src="{viewer_url}" width="100%" height="{height}" style="border: none;"></iframe>',
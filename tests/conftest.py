@@ -0,0 +1,55 @@
+"""
+Shared fixtures. Each test gets its own SQLite database (schema created and migrated
+like at API startup) and its own content store, both under pytest's tmp_path. The
+environment is set before backend is imported, so nothing touches the real data.
+"""
+import os
+import tempfile
+
+os.environ.pop("DATABASE_URL", None)
+os.environ["DATA_PATH"] = tempfile.mkdtemp(prefix="leitor_tests_")
+os.environ["CACHE_DIR"] = os.path.join(os.environ["DATA_PATH"], "cache")
+
+import pytest  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from backend import database, migrate_db, search_service, storage_service, upload_service  # noqa: E402
+
+
+@pytest.fixture
+def engine(tmp_path):
+    test_engine = database.make_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    database.Base.metadata.create_all(bind=test_engine)
+    migrate_db.migrate(test_engine)
+    search_service.ensure_schema(test_engine)
+    yield test_engine
+    test_engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine, monkeypatch):
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    # Startup helpers open their own sessions
+    monkeypatch.setattr(upload_service, "SessionLocal", factory)
+    return factory
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """Content store (backend/static) moved under tmp_path."""
+    static = tmp_path / "static"
+    uploads = static / "uploads"
+    monkeypatch.setattr(storage_service, "STATIC_DIR", str(static))
+    monkeypatch.setattr(storage_service, "UPLOADS_DIR", str(uploads))
+    monkeypatch.setattr(storage_service, "CAS_DIR", str(uploads / "cas"))
+    monkeypatch.setattr(storage_service, "TMP_DIR", str(uploads / "tmp"))
+    # The upload I/O limiter belongs to the event loop of the test that created it
+    monkeypatch.setattr(storage_service, "_io_limiter", None)
+    return static
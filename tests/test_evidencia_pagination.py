@@ -0,0 +1,106 @@
+import pytest
+
+from backend import evidencia_service
+from backend.models import Processo, EvidenciaMapeada, EvidenciaCatalogada
+
+
+def seed(db, processo_id=1):
+    """Both sources, several evidences per page (ties on the page), some without page."""
+    db.add(Processo(id=processo_id, numero_processo=str(processo_id), nome_descricao="x"))
+    for i in range(40):
+        pagina = None if i % 13 == 0 else i // 3
+        db.add(EvidenciaMapeada(processo_id=processo_id, tipo_evidencia=f"tipo {i % 4}",
+                                conteudo=f"certidão número {i}" + " certidão" * (i % 5),
+                                pagina_inicial=pagina, pagina_final=pagina))
+        db.add(EvidenciaCatalogada(processo_id=processo_id, origem_tipo=f"origem {i % 3}",
+                                   trecho=f"certidão anexa {i}" + " certidão" * (i % 7),
+                                   pagina_inicial=pagina, pagina_final=pagina))
+    db.commit()
+    rebuild(db, processo_id)
+
+
+def rebuild(db, processo_id=1):
+    for source_type in evidencia_service.SOURCE_MODELS:
+        evidencia_service.rebuild_unificadas(db, processo_id, source_type)
+    db.commit()
+
+
+def keys(items):
+    return [(item.source_type, item.id) for item in items]
+
+
+def paginate(db, limit, **filters):
+    pages, cursor = [], None
+    while True:
+        items, cursor = evidencia_service.list_unificadas(db, 1, cursor=cursor, limit=limit, **filters)
+        pages.append(keys(items))
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize("filters", [
+    {},
+    {"pg_min": 3, "pg_max": 9},
+    {"tipo": "tipo 1"},
+    {"q": "certidao"},
+    {"q": "certidao", "order": "relevance"},
+    {"q": "certidao", "order": "relevance", "pg_max": 6},
+])
+@pytest.mark.parametrize("limit", [1, 7, 50])
+def test_pages_concatenate_to_the_full_listing(db, filters, limit):
+    seed(db)
+    full, cursor = evidencia_service.list_unificadas(db, 1, **filters)
+    assert cursor is None and full
+
+    pages = paginate(db, limit, **filters)
+    assert all(len(page) <= limit for page in pages)
+    assert [key for page in pages for key in page] == keys(full)
+
+
+def test_cursor_ignores_rows_added_before_it(db):
+    seed(db)
+    first, cursor = evidencia_service.list_unificadas(db, 1, limit=10)
+    expected_rest, _ = evidencia_service.list_unificadas(db, 1)
+    expected_rest = keys(expected_rest)[10:]
+
+    # A reimport adds evidences on pages already read: the next page neither repeats
+    # nor skips anything
+    db.add(EvidenciaMapeada(processo_id=1, conteudo="nova", pagina_inicial=0, pagina_final=0))
+    db.commit()
+    rebuild(db)
+
+    rest, cursor = evidencia_service.list_unificadas(db, 1, cursor=cursor, limit=1000)
+    assert cursor is None
+    assert keys(rest) == expected_rest
+
+
+def test_relevance_cursor_is_not_accepted_for_page_order(db):
+    seed(db)
+    _, cursor = evidencia_service.list_unificadas(db, 1, q="certidao", order="relevance", limit=5)
+    with pytest.raises(ValueError):
+        evidencia_service.list_unificadas(db, 1, q="certidao", cursor=cursor, limit=5)
+
+
+@pytest.mark.parametrize("cursor", [
+    "=",
+    "nao-e-base64",
+    "W10=",  # []
+    "WyJwYWdpbmEiLCAxLCAib3V0cmEiLCAxXQ==",  # ["pagina", 1, "outra", 1]: unknown source
+])
+def test_malformed_cursor(db, cursor):
+    seed(db)
+    with pytest.raises(ValueError):
+        evidencia_service.list_unificadas(db, 1, cursor=cursor, limit=5)
+
+
+def test_projection_pages_match_full_rows(db):
+    seed(db)
+    full, _ = evidencia_service.list_unificadas(db, 1)
+    rows, cursor = [], None
+    while True:
+        items, cursor = evidencia_service.list_unificadas(db, 1, cursor=cursor, limit=9, fields="pagina_inicial")
+        rows += items
+        if cursor is None:
+            break
+    assert [(r["source_type"], r["id"], r["pagina_inicial"]) for r in rows] == \
+        [(i.source_type, i.id, i.pagina_inicial) for i in full]
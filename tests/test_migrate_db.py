@@ -0,0 +1,72 @@
+from sqlalchemy import inspect, text
+
+from backend import database, migrate_db
+from backend.database import Base
+
+ALL_VERSIONS = [versao for versao, _, _ in migrate_db.MIGRATIONS]
+
+
+def index_names(engine, table):
+    return {index["name"] for index in inspect(engine).get_indexes(table)}
+
+
+def test_fresh_database_records_every_version_once(tmp_path):
+    engine = database.make_engine(f"sqlite:///{tmp_path / 'novo.db'}")
+    Base.metadata.create_all(bind=engine)
+
+    assert migrate_db.migrate(engine) == ALL_VERSIONS
+    assert migrate_db.migrate(engine) == []
+    with engine.connect() as conn:
+        assert sorted(migrate_db.applied_versions(conn)) == ALL_VERSIONS
+
+
+def test_existing_database_is_upgraded_in_place(tmp_path):
+    engine = database.make_engine(f"sqlite:///{tmp_path / 'antigo.db'}")
+    Base.metadata.create_all(bind=engine)
+    # Back to the schema before the versioned migrations, with data in it
+    with engine.begin() as conn:
+        for table in ("evidencias_unificadas", "evidencias_facetas", "evidencias_histograma_paginas"):
+            conn.execute(text(f"DROP TABLE {table}"))
+        for index in ("ix_evidencias_mapeadas_processo_pagina", "ix_evidencias_catalogadas_processo_pagina"):
+            conn.execute(text(f"DROP INDEX {index}"))
+        for column in ("caminho_texto", "marcador_pagina", "data_version"):
+            conn.execute(text(f"ALTER TABLE processos DROP COLUMN {column}"))
+        # Created by the old version of migration 2; dropped by migration 7
+        conn.execute(text("CREATE INDEX ix_evidencias_mapeadas_processo_tipo "
+                          "ON evidencias_mapeadas (processo_id, tipo_evidencia)"))
+        conn.execute(text("INSERT INTO processos (id, numero_processo, nome_descricao) VALUES (1, '1', 'x')"))
+        for pagina in (1, 2, 2, 5):
+            conn.execute(text("INSERT INTO evidencias_mapeadas (processo_id, tipo_evidencia, conteudo, "
+                              "pagina_inicial, pagina_final) VALUES (1, 'Certidão', 'certidão', :p, :p)"),
+                         {"p": pagina})
+
+    assert migrate_db.migrate(engine) == ALL_VERSIONS
+
+    columns = {c["name"] for c in inspect(engine).get_columns("processos")}
+    assert {"caminho_texto", "marcador_pagina", "data_version"} <= columns
+    assert "ix_evidencias_mapeadas_processo_pagina" in index_names(engine, "evidencias_mapeadas")
+    assert "ix_evidencias_mapeadas_processo_tipo" not in index_names(engine, "evidencias_mapeadas")
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT data_version FROM processos")).scalar() == 1
+        # Backfilled: unified rows, facets and the evidence search index
+        assert conn.execute(text("SELECT count(*) FROM evidencias_unificadas")).scalar() == 4
+        assert conn.execute(text(
+            "SELECT quantidade FROM evidencias_facetas WHERE faceta = 'tipo'"
+        )).scalar() == 4
+        assert conn.execute(text(
+            "SELECT count(*) FROM evidencias_mapeadas_fts WHERE evidencias_mapeadas_fts MATCH 'certidao'"
+        )).scalar() == 4
+
+    # Running again (every API start) changes nothing
+    assert migrate_db.migrate(engine) == []
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM evidencias_unificadas")).scalar() == 4
+        assert conn.execute(text("SELECT count(*) FROM schema_migrations")).scalar() == len(ALL_VERSIONS)
+
+
+def test_steps_are_harmless_when_reapplied(engine):
+    # A database whose versions were recorded and whose schema is already current
+    with engine.begin() as conn:
+        for _, _, step in migrate_db.MIGRATIONS:
+            step(conn)
+    assert migrate_db.migrate(engine) == []
@@ -0,0 +1,59 @@
+import pytest
+
+from backend import evidencia_service, search_service
+from backend.models import Processo, EvidenciaMapeada
+
+
+@pytest.mark.parametrize("q, expected", [
+    ("certidão", '"certidão"'),
+    ("  certidão   de   óbito ", '"certidão" "de" "óbito"'),
+    ("fls. 10/12", '"fls." "10/12"'),
+    ('"nota fiscal', '"nota" "fiscal"'),
+    ('nota"fiscal"', '"notafiscal"'),
+    ("cert* -obito", '"cert*" "-obito"'),
+    ("a AND b OR NOT c", '"a" "AND" "b" "OR" "NOT" "c"'),
+    ("NEAR(a b)", '"NEAR(a" "b)"'),
+    ("documento : x", '"documento" ":" "x"'),
+    ("^inicio {col}", '"^inicio" "{col}"'),
+])
+def test_build_match_query_quotes_every_term(q, expected):
+    assert search_service.build_match_query(q) == expected
+
+
+def test_build_match_query_prefix():
+    assert search_service.build_match_query("cert obi", prefix=True) == '"cert"* "obi"*'
+
+
+@pytest.mark.parametrize("q", ["", "   ", '"', '""  "'])
+def test_build_match_query_empty_input(q):
+    assert search_service.build_match_query(q) == ""
+    assert search_service.build_match_query(q, prefix=True) == ""
+
+
+@pytest.mark.parametrize("q", [
+    "fls. 10/12", '"certidão', "a AND b", "OR", "NOT obito", "NEAR(a b)", "x*", "-x", "col:valor",
+    "^x", "(((", "{a b}", "'",
+])
+def test_fts_syntax_in_user_input_never_breaks_the_listing(db, q):
+    db.add(Processo(id=1, numero_processo="1", nome_descricao="x"))
+    db.add(EvidenciaMapeada(processo_id=1, tipo_evidencia="Certidão", conteudo=f"texto com {q} dentro",
+                            pagina_inicial=1, pagina_final=1))
+    db.commit()
+    evidencia_service.rebuild_unificadas(db, 1, "mapeada")
+    db.commit()
+
+    for order in evidencia_service.ORDERS:
+        items, _ = evidencia_service.list_unificadas(db, 1, q=q, order=order, limit=10)
+        assert len(items) <= 1
+
+
+def test_accent_insensitive_prefix_match(db):
+    db.add(Processo(id=1, numero_processo="1", nome_descricao="x"))
+    db.add(EvidenciaMapeada(processo_id=1, conteudo="Certidão de óbito", pagina_inicial=3, pagina_final=3))
+    db.add(EvidenciaMapeada(processo_id=1, conteudo="Nota fiscal", pagina_inicial=4, pagina_final=4))
+    db.commit()
+    evidencia_service.rebuild_unificadas(db, 1, "mapeada")
+    db.commit()
+
+    items, _ = evidencia_service.list_unificadas(db, 1, q="certidao obit")
+    assert [item.pagina_inicial for item in items] == [3]
@@ -0,0 +1,103 @@
+import hashlib
+import os
+import threading
+
+from backend import storage_service
+from backend.models import ArquivoArmazenado
+
+
+def publish(db, data: bytes, extensao=".pdf"):
+    buffer, tmp_path = storage_service.new_temp_file()
+    with buffer:
+        buffer.write(data)
+    return storage_service.publish_temp_file(db, tmp_path, hashlib.sha256(data).hexdigest(), len(data), extensao)
+
+
+def ref_count(db, sha256):
+    db.expire_all()
+    arquivo = db.get(ArquivoArmazenado, sha256)
+    return arquivo.ref_count if arquivo else None
+
+
+def test_same_content_is_stored_once(db, store):
+    first = publish(db, b"%PDF-1 mesmo conteudo")
+    second = publish(db, b"%PDF-1 mesmo conteudo")
+
+    assert first.caminho == second.caminho
+    assert ref_count(db, first.sha256) == 2
+    assert db.query(ArquivoArmazenado).count() == 1
+    assert os.listdir(storage_service.TMP_DIR) == []
+    with open(storage_service.real_path(first.caminho), "rb") as f:
+        assert f.read() == b"%PDF-1 mesmo conteudo"
+
+
+def test_release_deletes_with_the_last_reference(db, store):
+    arquivo = publish(db, b"texto\x0cpagina 2", ".txt")
+    publish(db, b"texto\x0cpagina 2", ".txt")
+    caminho, sha256 = arquivo.caminho, arquivo.sha256
+    path = storage_service.real_path(caminho)
+    sidecar = path + ".idx"
+    open(sidecar, "wb").close()
+
+    storage_service.release(db, caminho)
+    assert ref_count(db, sha256) == 1
+    assert os.path.exists(path) and os.path.exists(sidecar)
+
+    storage_service.release(db, caminho)
+    assert ref_count(db, sha256) is None
+    assert not os.path.exists(path) and not os.path.exists(sidecar)
+
+    # Releasing again (or a legacy path) is a no-op
+    storage_service.release(db, caminho)
+    storage_service.release(db, "uploads/antigo.pdf")
+
+
+def test_content_stored_again_after_release(db, store):
+    storage_service.release(db, publish(db, b"%PDF-1 volta").caminho)
+    again = publish(db, b"%PDF-1 volta")
+
+    assert ref_count(db, again.sha256) == 1
+    assert os.path.exists(storage_service.real_path(again.caminho))
+
+
+def test_concurrent_publish_and_release_keep_the_count(session_factory, store):
+    data = b"%PDF-1 concorrente" * 100
+    sha256 = hashlib.sha256(data).hexdigest()
+    errors = []
+
+    def run(action):
+        db = session_factory()
+        try:
+            action(db)
+        except Exception as e:  # surfaced by the assertion below
+            errors.append(e)
+        finally:
+            db.close()
+
+    def publish_one(db):
+        publish(db, data)
+
+    threads = [threading.Thread(target=run, args=(publish_one,)) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    db = session_factory()
+    assert not errors
+    assert ref_count(db, sha256) == 16
+    caminho = db.get(ArquivoArmazenado, sha256).caminho
+
+    def release_one(db):
+        storage_service.release(db, caminho)
+
+    # 16 releases racing 4 new uploads: 4 references left, and the blob with them
+    threads = [threading.Thread(target=run, args=(release_one,)) for _ in range(16)]
+    threads += [threading.Thread(target=run, args=(publish_one,)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert ref_count(db, sha256) == 4
+    assert os.path.exists(storage_service.real_path(caminho))
+    db.close()
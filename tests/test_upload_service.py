@@ -0,0 +1,146 @@
+import asyncio
+import hashlib
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend import upload_service, storage_service
+from backend.models import UploadParcial, ArquivoArmazenado
+
+DATA = os.urandom(300_000)
+
+
+async def body(data: bytes, piece=65536):
+    for i in range(0, len(data), piece):
+        yield data[i:i + piece]
+
+
+def put(db, upload_id, offset, data, chunk_sha256=None):
+    return asyncio.run(upload_service.write_chunk_async(db, upload_id, offset, body(data), chunk_sha256))
+
+
+def part_size(upload):
+    return os.path.getsize(upload.caminho_tmp)
+
+
+def test_resume_after_lost_state(db, store):
+    upload = upload_service.create_upload(db, "autos.pdf", len(DATA), hashlib.sha256(DATA).hexdigest())
+    put(db, upload.id, 0, DATA[:100_000])
+    # Server restart: the running hash is gone, finalize rebuilds it from disk
+    upload_service._hashers.pop(upload.id)
+
+    # The client resumes from `recebido`; a chunk it re-sends is accepted and ignored
+    assert upload_service.get_upload(db, upload.id).recebido == 100_000
+    assert put(db, upload.id, 0, DATA[:100_000]).recebido == 100_000
+    with pytest.raises(upload_service.UploadError) as error:
+        put(db, upload.id, 200_000, DATA[200_000:])
+    assert error.value.status_code == 409
+
+    put(db, upload.id, 100_000, DATA[100_000:])
+    upload = upload_service.finalize_upload(db, upload.id)
+    assert upload.status == "finalizado"
+    assert upload.sha256 == hashlib.sha256(DATA).hexdigest()
+    with open(storage_service.real_path(upload.caminho), "rb") as f:
+        assert f.read() == DATA
+
+
+def test_rejected_chunks_leave_no_bytes(db, store, monkeypatch):
+    monkeypatch.setattr(upload_service, "MAX_CHUNK_SIZE", 150_000)
+    upload = upload_service.create_upload(db, "autos.pdf", len(DATA))
+    put(db, upload.id, 0, DATA[:100_000])
+
+    cases = [
+        (DATA[100_000:], None, 413),  # body over the chunk limit, whatever Content-Length said
+        (DATA[100_000:200_000], "0" * 64, 422),  # chunk checksum mismatch
+    ]
+    for data, chunk_sha256, status_code in cases:
+        with pytest.raises(upload_service.UploadError) as error:
+            put(db, upload.id, 100_000, data, chunk_sha256)
+        assert error.value.status_code == status_code
+        assert upload_service.get_upload(db, upload.id).recebido == 100_000
+        assert part_size(upload) == 100_000
+
+    for i in range(100_000, len(DATA), 100_000):
+        chunk = DATA[i:i + 100_000]
+        put(db, upload.id, i, chunk, hashlib.sha256(chunk).hexdigest())
+    with pytest.raises(upload_service.UploadError) as error:
+        put(db, upload.id, len(DATA), b"x")
+    assert error.value.status_code == 400
+    assert upload_service.finalize_upload(db, upload.id).sha256 == hashlib.sha256(DATA).hexdigest()
+
+
+def test_finalize_checks_size_and_checksum(db, store):
+    upload = upload_service.create_upload(db, "autos.pdf", len(DATA), "0" * 64)
+    put(db, upload.id, 0, DATA[:1000])
+    with pytest.raises(upload_service.UploadError) as error:
+        upload_service.finalize_upload(db, upload.id)
+    assert error.value.status_code == 409
+
+    put(db, upload.id, 1000, DATA[1000:])
+    with pytest.raises(upload_service.UploadError) as error:
+        upload_service.finalize_upload(db, upload.id)
+    assert error.value.status_code == 422
+
+
+def test_only_pdfs(db, store):
+    with pytest.raises(upload_service.UploadError) as error:
+        upload_service.create_upload(db, "pagina.html", 10)
+    assert error.value.status_code == 415
+
+
+def test_abort_open_upload_removes_the_part_file(db, store):
+    upload = upload_service.create_upload(db, "autos.pdf", len(DATA))
+    put(db, upload.id, 0, DATA[:1000])
+    upload_service.abort_upload(db, upload.id)
+
+    assert not os.path.exists(upload.caminho_tmp)
+    assert db.query(UploadParcial).count() == 0
+    with pytest.raises(upload_service.UploadError) as error:
+        put(db, upload.id, 1000, DATA[1000:2000])
+    assert error.value.status_code == 404
+
+
+def test_abort_finalized_upload_releases_the_stored_file(db, store):
+    upload = upload_service.create_upload(db, "autos.pdf", len(DATA))
+    put(db, upload.id, 0, DATA)
+    caminho = upload_service.finalize_upload(db, upload.id).caminho
+    upload_service.abort_upload(db, upload.id)
+
+    assert not os.path.exists(storage_service.real_path(caminho))
+    assert db.query(ArquivoArmazenado).count() == 0
+
+
+def test_consumed_upload_cannot_be_reused(db, store):
+    upload = upload_service.create_upload(db, "autos.pdf", len(DATA))
+    put(db, upload.id, 0, DATA)
+    upload_service.finalize_upload(db, upload.id)
+
+    arquivo = upload_service.consume_upload(db, upload.id)
+    assert arquivo.ref_count == 1
+    with pytest.raises(upload_service.UploadError) as error:
+        upload_service.consume_upload(db, upload.id)
+    assert error.value.status_code == 409
+
+
+def test_expire_uploads(db, store):
+    aberto = upload_service.create_upload(db, "a.pdf", len(DATA))
+    put(db, aberto.id, 0, DATA[:1000])
+    finalizado = upload_service.create_upload(db, "b.pdf", 10)
+    put(db, finalizado.id, 0, b"0123456789")
+    caminho = upload_service.finalize_upload(db, finalizado.id).caminho
+    recente = upload_service.create_upload(db, "c.pdf", 10)
+    db.query(UploadParcial).filter(UploadParcial.id != recente.id).update(
+        {"atualizado_em": datetime.utcnow() - timedelta(hours=upload_service.UPLOAD_TTL_HOURS + 1)})
+    db.commit()
+    orfao = os.path.join(storage_service.TMP_DIR, "orfao.part")
+    open(orfao, "wb").close()
+    os.utime(orfao, (0, 0))
+
+    upload_service.expire_uploads()
+
+    db.expire_all()
+    assert [u.id for u in db.query(UploadParcial)] == [recente.id]
+    assert sorted(os.listdir(storage_service.TMP_DIR)) == [os.path.basename(recente.caminho_tmp)]
+    assert not os.path.exists(storage_service.real_path(caminho))
+    assert db.query(ArquivoArmazenado).count() == 0